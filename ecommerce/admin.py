@@ -1,11 +1,14 @@
 from django.contrib import admin
-from .models import User, Store, Product, Order, OrderItem, Review, PasswordResetToken
+from .models import User, Store, Product, Cart, CartItem, Order, OrderItem, OutboxEmail, Review, PasswordResetToken
 
 admin.site.register(User)
 admin.site.register(Store)
 admin.site.register(Product)
+admin.site.register(Cart)
+admin.site.register(CartItem)
 admin.site.register(Order)
 admin.site.register(OrderItem)
+admin.site.register(OutboxEmail)
 admin.site.register(Review)
 admin.site.register(PasswordResetToken)
 
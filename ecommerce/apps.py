@@ -5,7 +5,5 @@ class EcommerceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ecommerce'
 
-
-
-
-
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,367 @@
+import http.client
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from .models import User, Store, Product, Cart, CartItem
+
+ENDPOINTS = ['home', 'product_detail', 'cart', 'add_to_cart', 'checkout', 'vendor_dashboard']
+
+# How each server is started; {port}, {workers} and {threads} are filled in.
+SERVERS = {
+    'uvicorn': [
+        sys.executable, '-m', 'uvicorn', 'ecommerce_project.asgi:application',
+        '--port', '{port}', '--workers', '{workers}', '--log-level', 'warning', '--no-access-log',
+    ],
+    'gunicorn': [
+        sys.executable, '-m', 'gunicorn', 'ecommerce_project.wsgi:application',
+        '--bind', '127.0.0.1:{port}', '--workers', '{workers}', '--threads', '{threads}',
+        '--worker-class', 'gthread', '--log-level', 'warning',
+    ],
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def set_cart(user, cart):
+    """Replace the user's cart with {product_id: quantity}"""
+    user_cart, _ = Cart.objects.get_or_create(user=user)
+    user_cart.items.all().delete()
+    CartItem.objects.bulk_create(
+        CartItem(cart=user_cart, product_id=int(product_id), quantity=quantity)
+        for product_id, quantity in cart.items()
+    )
+
+
+class ShoppingFlowBenchmark:
+    """
+    Time the core shopping flow through the Django test client.
+
+    Every scenario runs `iterations` requests and reports latency percentiles
+    and the worst-case query count. Untimed setup (filling carts) happens
+    between requests.
+    """
+
+    def __init__(self, iterations=50, seed=0):
+        self.iterations = iterations
+        self.rng = random.Random(seed)
+        self.buyer = User.objects.filter(role=User.BUYER).order_by('pk').first()
+        self.vendor = Store.objects.order_by('pk').values_list('vendor', flat=True).first()
+        self.product_ids = list(
+            Product.objects.filter(stock_quantity__gte=50).order_by('pk').values_list('pk', flat=True)[:1000]
+        )
+        if not (self.buyer and self.vendor and self.product_ids):
+            raise ValueError('Benchmark database has no buyers, stores or stocked products; seed it first.')
+        self.buyer_client = Client()
+        self.buyer_client.force_login(self.buyer)
+        self.vendor_client = Client()
+        self.vendor_client.force_login(User.objects.get(pk=self.vendor))
+
+    def random_cart(self, size):
+        return {str(product_id): 1 for product_id in self.rng.sample(self.product_ids, size)}
+
+    def scenarios(self):
+        """Map endpoint name to (client, setup, path factory)"""
+        buyer, vendor = self.buyer_client, self.vendor_client
+        user = self.buyer
+        return {
+            'home': (buyer, None, lambda: '/'),
+            'product_detail': (buyer, None, lambda: f'/product/{self.rng.choice(self.product_ids)}/'),
+            'cart': (buyer, lambda: set_cart(user, self.random_cart(10)), lambda: '/cart/'),
+            'add_to_cart': (buyer, lambda: set_cart(user, {}), lambda: f'/cart/add/{self.rng.choice(self.product_ids)}/'),
+            'checkout': (buyer, lambda: set_cart(user, self.random_cart(3)), lambda: '/checkout/'),
+            'vendor_dashboard': (vendor, None, lambda: '/vendor/dashboard/'),
+        }
+
+    def run(self, endpoints=None):
+        results = {}
+        scenarios = self.scenarios()
+        for name in endpoints or ENDPOINTS:
+            client, setup, path = scenarios[name]
+            results[name] = self.measure(client, setup, path)
+        return results
+
+    def measure(self, client, setup, path):
+        # One untimed request warms template and URL resolver caches.
+        if setup:
+            setup()
+        client.get(path())
+
+        timings = []
+        queries = []
+        for _ in range(self.iterations):
+            if setup:
+                setup()
+            url = path()
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = client.get(url)
+                elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                raise RuntimeError(f'GET {url} returned {response.status_code}')
+            timings.append(elapsed * 1000)
+            queries.append(len(ctx))
+        return {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p90_ms': round(percentile(timings, 90), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries': max(queries),
+        }
+
+
+class ServerThroughputBenchmark:
+    """
+    Compare throughput of the catalog pages under uvicorn (ASGI, async views)
+    and gunicorn (WSGI, threaded workers) against the configured database.
+
+    Each server is started as a subprocess and loaded for `duration` seconds
+    by `concurrency` keep-alive client threads requesting the home page and
+    random product pages as a guest.
+    """
+
+    def __init__(self, duration=10, concurrency=32, workers=1, threads=8, seed=0):
+        self.duration = duration
+        self.concurrency = concurrency
+        self.workers = workers
+        self.threads = threads
+        self.seed = seed
+        self.product_ids = list(
+            Product.objects.filter(stock_quantity__gt=0).order_by('pk').values_list('pk', flat=True)[:1000]
+        )
+        if not self.product_ids:
+            raise ValueError('Database has no stocked products; seed it first.')
+
+    def run(self, servers=None):
+        return {name: self.measure(name) for name in servers or SERVERS}
+
+    def measure(self, name):
+        port = free_port()
+        command = [
+            part.format(port=port, workers=self.workers, threads=self.threads)
+            for part in SERVERS[name]
+        ]
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        try:
+            wait_for_port(port, server)
+            # Warm templates, URL resolvers and connections in every worker.
+            self.load(port, 2)
+            timings, errors = self.load(port, self.duration)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+        return {
+            'requests': len(timings),
+            'errors': errors,
+            'rps': round(len(timings) / self.duration, 1),
+            'p50_ms': round(percentile(timings, 50), 3) if timings else None,
+            'p99_ms': round(percentile(timings, 99), 3) if timings else None,
+        }
+
+    def load(self, port, duration):
+        """Run the client threads for `duration` seconds; return (latencies in ms, error count)"""
+        deadline = time.perf_counter() + duration
+        timings = []
+        errors = []
+        lock = threading.Lock()
+
+        def client(index):
+            rng = random.Random(self.seed + index)
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            local_timings, local_errors = [], 0
+            while time.perf_counter() < deadline:
+                path = '/' if rng.random() < 0.5 else f'/product/{rng.choice(self.product_ids)}/'
+                start = time.perf_counter()
+                try:
+                    conn.request('GET', path)
+                    response = conn.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException):
+                    local_errors += 1
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                    continue
+                if response.status >= 400:
+                    local_errors += 1
+                else:
+                    local_timings.append((time.perf_counter() - start) * 1000)
+            conn.close()
+            with lock:
+                timings.extend(local_timings)
+                errors.append(local_errors)
+
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return timings, sum(errors)
+
+
+class ConcurrentReadBenchmark:
+    """
+    Measure catalog read throughput from `readers` threads, each on its own
+    database connection, while one writer thread keeps committing small
+    transactions. Runs once per pragma profile: SQLite's defaults (rollback
+    journal, FULL sync, no mmap) and the configured SQLITE_PRAGMAS in WAL mode.
+    """
+
+    def __init__(self, readers=8, duration=5, write_batch=50, seed=0):
+        self.readers = readers
+        self.duration = duration
+        self.write_batch = write_batch
+        self.seed = seed
+        self.product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True)[:5000])
+        if not self.product_ids:
+            raise ValueError('Benchmark database has no products; seed it first.')
+
+    def profiles(self):
+        return {
+            'default': {'journal_mode': 'delete', 'synchronous': 'full', 'busy_timeout': 5000, 'mmap_size': 0},
+            # The benchmark database is its own file, so WAL is always safe to enable here
+            'tuned': {**settings.SQLITE_PRAGMAS, 'journal_mode': 'wal'},
+        }
+
+    def run(self):
+        results = {}
+        for name, pragmas in self.profiles().items():
+            # New connections pick up the profile through the connection_created handler.
+            connections.close_all()
+            with override_settings(SQLITE_PRAGMAS=pragmas):
+                results[name] = self.measure()
+            connections.close_all()
+        return results
+
+    def measure(self):
+        deadline = time.perf_counter() + self.duration
+        timings = []
+        counts = {'errors': 0, 'writes': 0}
+        lock = threading.Lock()
+
+        def reader(index):
+            rng = random.Random(self.seed + index)
+            local_timings, errors = [], 0
+            try:
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        Product.objects.select_related('store').get(pk=rng.choice(self.product_ids))
+                        list(
+                            Product.objects.filter(stock_quantity__gt=0).select_related('store')
+                            .order_by('-created_at', '-pk')[:24]
+                        )
+                    except OperationalError:
+                        errors += 1
+                        continue
+                    local_timings.append((time.perf_counter() - start) * 1000)
+            finally:
+                connection.close()
+            with lock:
+                timings.extend(local_timings)
+                counts['errors'] += errors
+
+        def writer():
+            rng = random.Random(self.seed - 1)
+            try:
+                while time.perf_counter() < deadline:
+                    batch = rng.sample(self.product_ids, min(self.write_batch, len(self.product_ids)))
+                    try:
+                        with transaction.atomic():
+                            Product.objects.filter(pk__in=batch).update(updated_at=timezone.now())
+                    except OperationalError:
+                        with lock:
+                            counts['errors'] += 1
+                        continue
+                    counts['writes'] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(self.readers)]
+        threads.append(threading.Thread(target=writer))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {
+            'reads_per_sec': round(len(timings) / self.duration, 1),
+            'writes_per_sec': round(counts['writes'] / self.duration, 1),
+            'read_p50_ms': round(percentile(timings, 50), 3) if timings else None,
+            'read_p99_ms': round(percentile(timings, 99), 3) if timings else None,
+            'errors': counts['errors'],
+        }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    """Block until a server subprocess accepts connections on port"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with status {process.returncode} before listening')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server did not listen on port {port} within {timeout}s')
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return a list of regression messages: p90 latency more than `tolerance`
+    (a fraction) above the baseline, or more queries than the baseline.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['p90_ms'] > previous['p90_ms'] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p90 {current['p90_ms']:.1f}ms vs baseline {previous['p90_ms']:.1f}ms"
+            )
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f"{name}: {current['queries']} queries vs baseline {previous['queries']}"
+            )
+    return regressions
+
+
+def check_baseline(results, path, tolerance):
+    """compare() against the baseline saved at path, or None if there is none yet"""
+    if not os.path.exists(path):
+        return None
+    return compare(results, load_baseline(path), tolerance)
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
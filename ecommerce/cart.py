@@ -0,0 +1,192 @@
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import Cart, CartItem
+
+
+def can_shop(user):
+    """Guests and buyers have carts; vendors do not"""
+    return not user.is_authenticated or user.is_buyer()
+
+
+class SessionCart:
+    """
+    The current visitor's cart, stored as Cart/CartItem rows.
+
+    A buyer's cart belongs to their account, so it survives logouts, session
+    expiry and other devices. A guest's cart is found through the cart id kept
+    in the session and is merged into the buyer's cart at login. resolve()
+    loads every line with its product and store in one joined query. The
+    total number of units is kept in the session under COUNT_KEY so the
+    navbar badge never needs a query.
+    """
+    CART_ID_KEY = 'cart_id'
+    COUNT_KEY = 'cart_count'
+    # Carts from before they were stored in the database: {product_id: quantity}
+    LEGACY_SESSION_KEY = 'cart'
+
+    def __init__(self, request, user=None):
+        self.session = request.session
+        self.user = user or request.user
+        self._data = None
+        legacy = self.session.pop(self.LEGACY_SESSION_KEY, None)
+        if legacy:
+            self.upsert(legacy)
+            self.refresh_count()
+
+    def lines(self):
+        """CartItem queryset for this visitor, without fetching the Cart row"""
+        if self.user.is_authenticated:
+            return CartItem.objects.filter(cart__user=self.user)
+        cart_id = self.session.get(self.CART_ID_KEY)
+        if cart_id is None:
+            return CartItem.objects.none()
+        return CartItem.objects.filter(cart_id=cart_id, cart__user__isnull=True)
+
+    def cart_id(self):
+        """Id of the visitor's Cart, creating it on first write"""
+        if self.user.is_authenticated:
+            return Cart.objects.get_or_create(user=self.user)[0].pk
+        cart_id = self.session.get(self.CART_ID_KEY)
+        if cart_id is None or not Cart.objects.filter(pk=cart_id, user__isnull=True).exists():
+            cart_id = self.session[self.CART_ID_KEY] = Cart.objects.create().pk
+        return cart_id
+
+    @property
+    def data(self):
+        """{product_id: quantity} with string keys, as place_order expects"""
+        if self._data is None:
+            self._data = {
+                str(product_id): quantity
+                for product_id, quantity in self.lines().values_list('product_id', 'quantity')
+            }
+        return self._data
+
+    def __bool__(self):
+        return bool(self.data)
+
+    def __contains__(self, product_id):
+        return str(product_id) in self.data
+
+    def has_cart(self):
+        """False for a guest who has never added anything, whose session must stay empty"""
+        return self.user.is_authenticated or self.CART_ID_KEY in self.session
+
+    def count(self):
+        """Total number of units in the cart"""
+        if not self.has_cart():
+            return 0
+        count = self.session.get(self.COUNT_KEY)
+        if count is None:
+            count = self.refresh_count()
+        return count
+
+    def refresh_count(self):
+        count = self.lines().aggregate(units=Sum('quantity'))['units'] or 0
+        if self.has_cart() and self.session.get(self.COUNT_KEY) != count:
+            self.session[self.COUNT_KEY] = count
+        self._data = None
+        return count
+
+    def quantity(self, product_id):
+        return self.lines().filter(product_id=product_id).values_list('quantity', flat=True).first() or 0
+
+    def upsert(self, quantities):
+        """Set {product_id: quantity} for several products with one INSERT ... ON CONFLICT UPDATE"""
+        cart_id = self.cart_id()
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart_id=cart_id, product_id=int(product_id), quantity=quantity)
+                for product_id, quantity in quantities.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity', 'updated_at'],
+        )
+
+    def set(self, product_id, quantity):
+        if quantity > 0:
+            self.upsert({product_id: quantity})
+        else:
+            self.lines().filter(product_id=product_id).delete()
+        self.refresh_count()
+
+    def remove(self, product_id):
+        self.set(product_id, 0)
+
+    def clear(self):
+        self.lines().delete()
+        self.refresh_count()
+
+    def resolve(self):
+        """
+        Return (items, total) for the cart, pruning products that are out of
+        stock. Lines, prices and stock come from one joined query; lines for
+        deleted products are removed by the foreign key cascade.
+        """
+        lines = list(self.lines().select_related('product__store').order_by('pk'))
+        items, total, pruned = self.price(lines)
+        if pruned:
+            CartItem.objects.filter(pk__in=pruned).delete()
+        count = sum(item['quantity'] for item in items)
+        if self.has_cart() and self.session.get(self.COUNT_KEY) != count:
+            # Also picks up changes made from another device
+            self.session[self.COUNT_KEY] = count
+        self._data = None
+        return items, total
+
+    async def aresolve(self):
+        """resolve() for async views, using the async ORM and session API"""
+        lines = [line async for line in self.lines().select_related('product__store').order_by('pk')]
+        items, total, pruned = self.price(lines)
+        if pruned:
+            await CartItem.objects.filter(pk__in=pruned).adelete()
+        count = sum(item['quantity'] for item in items)
+        has_cart = self.user.is_authenticated or await self.session.aget(self.CART_ID_KEY) is not None
+        if has_cart and await self.session.aget(self.COUNT_KEY) != count:
+            await self.session.aset(self.COUNT_KEY, count)
+        self._data = None
+        return items, total
+
+    @staticmethod
+    def price(lines):
+        """Split cart lines into (items, total, ids of out-of-stock lines to prune)"""
+        items = []
+        total = 0
+        pruned = []
+        for line in lines:
+            product = line.product
+            if not product.is_in_stock():
+                pruned.append(line.pk)
+                continue
+            item_total = product.price * line.quantity
+            total += item_total
+            items.append({
+                'product': product,
+                'quantity': line.quantity,
+                'total': item_total,
+            })
+        return items, total, pruned
+
+    def merge_guest_cart(self):
+        """
+        Fold the cart the visitor filled as a guest into their own cart at
+        login: quantities for products in both are added, with one upsert.
+        """
+        cart_id = self.session.pop(self.CART_ID_KEY, None)
+        if cart_id is not None:
+            with transaction.atomic():
+                guest_lines = dict(
+                    CartItem.objects.filter(cart_id=cart_id, cart__user__isnull=True)
+                    .values_list('product_id', 'quantity')
+                )
+                if guest_lines:
+                    existing = dict(
+                        self.lines().filter(product_id__in=guest_lines).values_list('product_id', 'quantity')
+                    )
+                    self.upsert({
+                        product_id: quantity + existing.get(product_id, 0)
+                        for product_id, quantity in guest_lines.items()
+                    })
+                Cart.objects.filter(pk=cart_id, user__isnull=True).delete()
+        self.refresh_count()
@@ -0,0 +1,116 @@
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+
+from .models import Product, Order, OrderItem
+from .orders import invalidate_order_summary
+from .outbox import enqueue_invoice
+from .purchases import record_purchases
+from .sales import record_sale
+
+
+class CheckoutError(Exception):
+    """Raised when a cart cannot be turned into an order; carries user-facing messages"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+class StockConflict(CheckoutError):
+    """Raised when stock ran out between validation and the stock decrement"""
+
+
+# How SQLite, MySQL and PostgreSQL word an OperationalError for a lock that
+# other transactions held too long; anything else is a real failure.
+LOCK_ERRORS = ('database is locked', 'database table is locked', 'lock wait timeout', 'deadlock')
+
+
+def is_lock_error(error):
+    """Whether a database error only means the checkout lost a lock race and can be retried"""
+    message = str(error).lower()
+    return any(text in message for text in LOCK_ERRORS)
+
+
+def place_order(buyer, cart):
+    """
+    Turn a session cart ({product_id: quantity}) into an order in one transaction.
+
+    All cart products are fetched and locked with a single SELECT ... FOR UPDATE,
+    stock is decremented with one conditional UPDATE and order items are written
+    with one bulk INSERT. The invoice email is queued, and the daily sales
+    rollups and the buyer's purchased products are updated, in the same
+    transaction; the buyer's cached order summary is dropped once it commits.
+    Returns (order, items) where items is a list of
+    {'product', 'quantity', 'total'} dicts; raises CheckoutError if nothing was
+    written.
+    """
+    quantities = {int(product_id): quantity for product_id, quantity in cart.items()}
+    if not quantities:
+        raise CheckoutError(['Your cart is empty.'])
+
+    with transaction.atomic():
+        products = Product.objects.select_for_update().in_bulk(list(quantities))
+
+        items = []
+        errors = []
+        total = 0
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                errors.append(f'Product with ID {product_id} no longer exists.')
+                continue
+            if not product.is_in_stock():
+                errors.append(f'{product.name} is out of stock.')
+                continue
+            if quantity > product.stock_quantity:
+                errors.append(f'Only {product.stock_quantity} {product.name} available.')
+                continue
+
+            item_total = product.price * quantity
+            total += item_total
+            items.append({
+                'product': product,
+                'quantity': quantity,
+                'total': item_total,
+            })
+
+        if errors:
+            raise CheckoutError(errors)
+
+        # Decrement every line in one statement; each row only matches while it
+        # still has enough stock, so a short row count means another checkout won.
+        in_stock = reduce(or_, (
+            Q(pk=item['product'].pk, stock_quantity__gte=item['quantity']) for item in items
+        ))
+        updated = Product.objects.filter(in_stock).update(
+            stock_quantity=Case(
+                *[When(pk=item['product'].pk, then=F('stock_quantity') - item['quantity']) for item in items],
+                default=F('stock_quantity'),
+                output_field=PositiveIntegerField(),
+            )
+        )
+        if updated != len(items):
+            raise StockConflict(['Some items in your cart sold out while you were checking out.'])
+
+        order = Order.objects.create(buyer=buyer, total_amount=total)
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item['product'],
+                quantity=item['quantity'],
+                price=item['product'].price,
+            )
+            for item in items
+        ])
+        enqueue_invoice(order, items)
+        record_sale(order, items)
+        record_purchases(buyer, items)
+
+    invalidate_order_summary(buyer.pk)
+    for item in items:
+        item['product'].stock_quantity -= item['quantity']
+
+    return order, items
@@ -0,0 +1,84 @@
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from .models import OrderItem
+
+EXPORT_COLUMNS = ['order_id', 'ordered_at', 'buyer', 'store', 'product_id', 'product', 'quantity', 'price', 'line_total']
+# Vendors see what sold, not who bought it
+VENDOR_EXPORT_COLUMNS = [column for column in EXPORT_COLUMNS if column != 'buyer']
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output"""
+
+    def write(self, value):
+        return value
+
+
+def order_lines(user):
+    """
+    (columns, queryset) of the order lines visible to a user: a buyer's own
+    purchases, or every sale of a vendor's products. Selects the joined
+    columns directly, so no model instances are built. Left unordered: the
+    export is read through one server-side cursor, and sorting would make
+    the database order every line before returning the first.
+    """
+    if user.is_vendor():
+        lines = OrderItem.objects.filter(product__store__vendor=user)
+        return VENDOR_EXPORT_COLUMNS, lines.values_list(
+            'order_id', 'order__created_at', 'product__store__name',
+            'product_id', 'product__name', 'quantity', 'price',
+        )
+    lines = OrderItem.objects.filter(order__buyer=user)
+    return EXPORT_COLUMNS, lines.values_list(
+        'order_id', 'order__created_at', 'order__buyer__username', 'product__store__name',
+        'product_id', 'product__name', 'quantity', 'price',
+    )
+
+
+def export_row(row):
+    order_id, ordered_at, *rest, quantity, price = row
+    return [order_id, ordered_at.isoformat(), *rest, quantity, price, price * quantity]
+
+
+def encoder(fmt, columns):
+    """(header line or None, function turning a row into a line) for an export format"""
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        return writer.writerow(columns), writer.writerow
+    return None, lambda row: json.dumps(dict(zip(columns, row)), default=str) + '\n'
+
+
+def stream_export(user, fmt, chunk_size=2000):
+    """Yield the user's order lines as CSV or NDJSON, one encoded line at a time"""
+    columns, lines = order_lines(user)
+    header, encode = encoder(fmt, columns)
+    if header is not None:
+        yield header
+    for row in lines.iterator(chunk_size=chunk_size):
+        yield encode(export_row(row))
+
+
+async def astream_export(user, fmt, chunk_size=2000):
+    """
+    stream_export() for ASGI servers. Django would collect a sync iterator
+    into a list before sending anything; this fetches one chunk at a time in
+    the database thread, so bytes go out as rows are read. (QuerySet.aiterator()
+    cannot be used: for values_list() it runs the query on the event loop.)
+    """
+    columns, lines = order_lines(user)
+    header, encode = encoder(fmt, columns)
+    if header is not None:
+        yield header
+    rows = lines.iterator(chunk_size=chunk_size)
+    next_chunk = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    while chunk := await next_chunk():
+        for row in chunk:
+            yield encode(export_row(row))
@@ -1,5 +1,7 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm
+from django.core.validators import FileExtensionValidator
 from .models import User, Store, Product, Review
 
 
@@ -58,9 +60,10 @@ class ProductForm(forms.ModelForm):
     """Form for creating/editing products"""
     class Meta:
         model = Product
-        fields = ['name', 'description', 'price', 'stock_quantity', 'image', 'store']
+        fields = ['name', 'sku', 'description', 'price', 'stock_quantity', 'image', 'store']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
+            'sku': forms.TextInput(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
             'price': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'min': '0'}),
             'stock_quantity': forms.NumberInput(attrs={'class': 'form-control', 'min': '0'}),
@@ -68,6 +71,18 @@ class ProductForm(forms.ModelForm):
             'store': forms.Select(attrs={'class': 'form-control'}),
         }
     
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Files rejected mid-stream by ecommerce.uploads.ImageUploadHandler
+        self.upload_errors = upload_errors or {}
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        for field, message in self.upload_errors.items():
+            if field in self.fields:
+                self.add_error(field, message)
+        return cleaned_data
+    
     def clean_price(self):
         price = self.cleaned_data.get('price')
         if price and price < 0:
@@ -84,12 +99,43 @@ class ProductForm(forms.ModelForm):
         image = self.cleaned_data.get('image')
         if image:
             # Check file size (max 5MB)
-            if image.size > 5 * 1024 * 1024:
-                raise forms.ValidationError('Image file too large (max 5MB).')
+            if image.size > settings.PRODUCT_IMAGE_MAX_UPLOAD_SIZE:
+                limit = settings.PRODUCT_IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)
+                raise forms.ValidationError(f'Image file too large (max {limit}MB).')
             # Check file type
             if not image.content_type.startswith('image/'):
                 raise forms.ValidationError('File must be an image.')
         return image
+    
+    def save(self, commit=True):
+        # Renditions are generated off the request path by `manage.py process_images`
+        if 'image' in self.changed_data:
+            self.instance.renditions_pending = True
+        return super().save(commit)
+
+
+class ProductImportRowForm(forms.Form):
+    """One row of a bulk product import, validated with the ProductForm rules"""
+    sku = Product._meta.get_field('sku').formfield(required=True)
+    name = Product._meta.get_field('name').formfield()
+    description = Product._meta.get_field('description').formfield()
+    price = Product._meta.get_field('price').formfield()
+    stock_quantity = Product._meta.get_field('stock_quantity').formfield()
+    
+    clean_price = ProductForm.clean_price
+    clean_stock_quantity = ProductForm.clean_stock_quantity
+
+
+IMPORT_EXTENSIONS = ['csv', 'json', 'jsonl', 'ndjson']
+
+
+class ProductImportForm(forms.Form):
+    """Form for uploading a bulk product import file"""
+    file = forms.FileField(
+        validators=[FileExtensionValidator(IMPORT_EXTENSIONS)],
+        help_text='CSV with a header row, a JSON array or JSON Lines with sku, name, description, price and stock_quantity',
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': ','.join(f'.{ext}' for ext in IMPORT_EXTENSIONS)}),
+    )
 
 
 class ReviewForm(forms.ModelForm):
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from .cart import can_shop
+
+# Cards render differently for shoppers (guests and buyers, who get an
+# "Add to Cart" button) and vendors.
+CARD_VARIANTS = ('shopper', 'vendor')
+
+
+def card_cache():
+    return caches[settings.PRODUCT_CARD_CACHE]
+
+
+def card_key(product_id, variant):
+    return f'product_card:{product_id}:{variant}'
+
+
+def card_variant(user):
+    return 'shopper' if can_shop(user) else 'vendor'
+
+
+def card_version(product):
+    """
+    Everything a card displays that can change without the cache being told:
+    stock is decremented with queryset updates that skip signals and updated_at.
+    """
+    return (product.updated_at, product.stock_quantity, product.store.updated_at)
+
+
+class ProductCardCache:
+    """
+    Rendered product-card fragments for one page, fetched with a single
+    get_many. Entries are stored with the product version they were rendered
+    from and are ignored when the product has changed since.
+    """
+
+    def __init__(self, products, user):
+        self.variant = card_variant(user)
+        self.cache = card_cache()
+        keys = [card_key(product.pk, self.variant) for product in products]
+        self.entries = self.cache.get_many(keys) if keys else {}
+
+    def get(self, product):
+        entry = self.entries.get(card_key(product.pk, self.variant))
+        if entry is not None and entry[0] == card_version(product):
+            return entry[1]
+        return None
+
+    def set(self, product, html):
+        key = card_key(product.pk, self.variant)
+        entry = (card_version(product), html)
+        self.entries[key] = entry
+        self.cache.set(key, entry, settings.PRODUCT_CARD_CACHE_TIMEOUT)
+
+
+def invalidate_product_cards(product_ids):
+    """Drop cached cards for the given products"""
+    keys = [card_key(product_id, variant) for product_id in product_ids for variant in CARD_VARIANTS]
+    if keys:
+        card_cache().delete_many(keys)
@@ -0,0 +1,104 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from .fragments import invalidate_product_cards
+from .models import Product
+
+
+def rendition_format():
+    """Configured rendition format, falling back to JPEG when Pillow lacks WebP"""
+    fmt = settings.PRODUCT_IMAGE_RENDITION_FORMAT.upper()
+    if fmt == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return fmt
+
+
+def encode(image, fmt):
+    buffer = BytesIO()
+    if fmt == 'WEBP':
+        image.save(buffer, 'WEBP', quality=settings.PRODUCT_IMAGE_RENDITION_QUALITY, method=4)
+    else:
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(buffer, 'JPEG', quality=settings.PRODUCT_IMAGE_RENDITION_QUALITY,
+                   optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def delete_renditions(renditions):
+    for name in renditions.values():
+        default_storage.delete(name)
+
+
+def generate_renditions(product):
+    """
+    Write one downscaled copy of the product image per configured width (never
+    upscaling) and return {actual width: storage name}. The original is left
+    untouched.
+    """
+    fmt = rendition_format()
+    extension = 'webp' if fmt == 'WEBP' else 'jpg'
+    stem = os.path.splitext(os.path.basename(product.image.name))[0]
+
+    with default_storage.open(product.image.name, 'rb') as f:
+        source = ImageOps.exif_transpose(Image.open(f))
+        source.load()
+    if source.mode not in ('RGB', 'RGBA'):
+        has_alpha = 'A' in source.getbands() or 'transparency' in source.info
+        source = source.convert('RGBA' if has_alpha else 'RGB')
+
+    renditions = {}
+    for width in sorted(settings.PRODUCT_IMAGE_RENDITION_WIDTHS):
+        image = source.copy()
+        image.thumbnail((width, width * 10), Image.Resampling.LANCZOS)
+        name = default_storage.save(
+            f'products/renditions/{product.pk}/{stem}-{image.width}w.{extension}',
+            ContentFile(encode(image, fmt)),
+        )
+        renditions[str(image.width)] = name
+        if width >= source.width:
+            # The source is no wider than this; larger widths would be identical.
+            break
+    return renditions
+
+
+def process_product(product):
+    """Regenerate renditions for one product; returns False if the image is unreadable"""
+    old = product.image_renditions or {}
+    renditions = {}
+    ok = True
+    if product.image:
+        try:
+            renditions = generate_renditions(product)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+            ok = False
+    with transaction.atomic():
+        # Only if the image is still the one processed; a newer upload keeps
+        # its pending flag and is picked up by the next batch.
+        updated = Product.objects.filter(pk=product.pk, image=product.image.name).update(
+            image_renditions=renditions, renditions_pending=False,
+        )
+    if not updated:
+        delete_renditions({key: name for key, name in renditions.items() if name not in old.values()})
+        return ok
+    delete_renditions({key: name for key, name in old.items() if name not in renditions.values()})
+    return ok
+
+
+def process_pending(batch_size=None):
+    """Process one batch of products whose image changed; returns (processed, failed)"""
+    batch_size = batch_size or settings.PRODUCT_IMAGE_BATCH_SIZE
+    products = list(
+        Product.objects.filter(renditions_pending=True)
+        .only('id', 'image', 'image_renditions')
+        .order_by('pk')[:batch_size]
+    )
+    failed = sum(not process_product(product) for product in products)
+    invalidate_product_cards([product.pk for product in products])
+    return len(products), failed
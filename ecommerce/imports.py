@@ -0,0 +1,127 @@
+import csv
+import io
+import json
+import os
+import re
+
+from django.db import transaction
+
+from .forms import ProductImportRowForm
+from .fragments import invalidate_product_cards
+from .models import Product
+from .seeding import batched
+from . import search
+
+IMPORT_FIELDS = ['sku', 'name', 'description', 'price', 'stock_quantity']
+# Whitespace, commas and brackets between the objects of a JSON array or JSON Lines file
+JSON_SEPARATORS = re.compile(r'[\s,\[\]]*')
+# A malformed row would otherwise make read_json buffer the rest of the file
+MAX_JSON_ROW_CHARS = 1024 * 1024
+
+
+class ImportFormatError(ValueError):
+    """Raised when an import file cannot be parsed"""
+
+
+def read_csv(stream):
+    """Yield one dict per CSV row, keyed by the header row"""
+    yield from csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+
+
+def read_json(stream, chunk_size=64 * 1024):
+    """
+    Yield the objects of a JSON array or of a JSON Lines file, decoding the
+    stream a chunk at a time so memory does not grow with the file.
+    """
+    decoder = json.JSONDecoder()
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    buffer, pos, eof = '', 0, False
+    while True:
+        pos = JSON_SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer):
+            try:
+                row, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof or len(buffer) - pos > MAX_JSON_ROW_CHARS:
+                    raise
+            else:
+                yield row
+                continue
+        elif eof:
+            return
+        # Either the buffer is used up or the next object is cut off: read on.
+        chunk = text.read(chunk_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+
+def read_rows(stream, filename):
+    """Rows of an import file, parsed according to its extension"""
+    reader = read_csv if os.path.splitext(filename)[1].lower() == '.csv' else read_json
+    try:
+        yield from reader(stream)
+    except (csv.Error, ValueError) as e:
+        raise ImportFormatError(f'Could not read {os.path.basename(filename)}: {e}') from e
+
+
+class ProductImporter:
+    """
+    Create or update a store's products from import rows, matching on SKU.
+
+    Rows are validated one by one with ProductImportRowForm; invalid rows are
+    reported and skipped without affecting the rest. Valid rows are written
+    in batches, each one transaction with a SKU lookup and a single upserting
+    bulk_create, so memory use depends on batch_size rather than on the file.
+    At most max_errors row errors are kept.
+    """
+
+    def __init__(self, store, batch_size=1000, max_errors=100):
+        self.store = store
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def run(self, rows):
+        for batch in batched(enumerate(rows, start=1), self.batch_size):
+            valid = {}
+            for number, row in batch:
+                if not isinstance(row, dict):
+                    self.add_error(number, 'Row must be an object with ' + ', '.join(IMPORT_FIELDS) + '.')
+                    continue
+                form = ProductImportRowForm(row)
+                if form.is_valid():
+                    # A SKU repeated within a batch: the last row wins
+                    valid[form.cleaned_data['sku']] = form.cleaned_data
+                else:
+                    self.add_error(number, '; '.join(
+                        f'{field}: {" ".join(messages)}' for field, messages in form.errors.items()
+                    ))
+            if valid:
+                self.write(valid)
+        return self
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((row_number, message))
+
+    def write(self, rows):
+        """Upsert {sku: cleaned row} into the store with one INSERT ... ON CONFLICT UPDATE"""
+        with transaction.atomic():
+            existing = set(
+                Product.objects.filter(store=self.store, sku__in=list(rows)).values_list('sku', flat=True)
+            )
+            products = Product.objects.bulk_create(
+                [Product(store=self.store, **data) for data in rows.values()],
+                update_conflicts=True,
+                unique_fields=['store', 'sku'],
+                update_fields=['name', 'description', 'price', 'stock_quantity', 'updated_at'],
+            )
+            # Bulk writes skip the post_save signals that keep these in sync
+            search.index_products(products)
+        invalidate_product_cards([product.pk for product in products if product.sku in existing])
+        self.created += len(rows) - len(existing)
+        self.updated += len(existing)
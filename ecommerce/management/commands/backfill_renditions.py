@@ -0,0 +1,23 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from ecommerce.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Queue renditions for existing product images and process them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate renditions for products that already have them')
+        parser.add_argument('--queue-only', action='store_true',
+                            help='Only mark products as pending; leave processing to process_images')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            products = products.filter(image_renditions={})
+        queued = products.update(renditions_pending=True)
+        self.stdout.write(f'Queued {queued} products')
+        if not options['queue_only']:
+            call_command('process_images', stdout=self.stdout)
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from ecommerce.benchmarks import ENDPOINTS, ShoppingFlowBenchmark, check_baseline, save_baseline
+from ecommerce.models import Product
+from ecommerce.seeding import SCALES, CatalogSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a dedicated benchmark database and measure latency percentiles and query '
+        'counts for the core shopping flow, optionally gating on a saved baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small',
+                            help='Size of the synthetic dataset')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for data and requests')
+        parser.add_argument('--iterations', type=int, default=50, help='Requests per endpoint')
+        parser.add_argument('--endpoint', action='append', choices=ENDPOINTS, dest='endpoints',
+                            help='Only benchmark this endpoint (repeatable)')
+        parser.add_argument('--database', default=str(settings.BASE_DIR / 'bench.sqlite3'),
+                            help='SQLite file holding the benchmark dataset')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Reuse an already seeded benchmark database and keep it afterwards')
+        parser.add_argument('--baseline', default=str(settings.BASE_DIR / 'benchmark_baseline.json'),
+                            help='Baseline results file')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Write this run as the new baseline instead of comparing')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p90 slowdown against the baseline, as a fraction')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The benchmark manages its own SQLite database file.')
+
+        setup_test_environment()
+        connection.settings_dict['TEST']['NAME'] = options['database']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'],
+        )
+        try:
+            if not Product.objects.exists():
+                self.stdout.write(f"Seeding {options['scale']} dataset into {options['database']}...")
+                created = CatalogSeeder(options['scale'], seed=options['seed']).run()
+                self.stdout.write(', '.join(f'{count} {name}' for name, count in created.items()))
+
+            results = ShoppingFlowBenchmark(options['iterations'], seed=options['seed']).run(options['endpoints'])
+        finally:
+            connection.creation.destroy_test_db(options['database'], verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.stdout.write(f"{'endpoint':<18}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'queries':>10}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<18}{result['p50_ms']:>10.2f}{result['p90_ms']:>10.2f}"
+                f"{result['p99_ms']:>10.2f}{result['queries']:>10}"
+            )
+
+        if options['save_baseline']:
+            save_baseline(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {options['baseline']}"))
+            return
+
+        regressions = check_baseline(results, options['baseline'], options['tolerance'])
+        if regressions is None:
+            self.stdout.write(self.style.WARNING('No baseline found; run with --save-baseline to create one.'))
+            return
+        if regressions:
+            raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against baseline.'))
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from ecommerce.benchmarks import ConcurrentReadBenchmark
+from ecommerce.models import Product
+from ecommerce.seeding import SCALES, CatalogSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a dedicated SQLite benchmark database and compare concurrent read throughput, '
+        'with a writer running, under SQLite defaults and under SQLITE_PRAGMAS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small',
+                            help='Size of the synthetic dataset')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for data and queries')
+        parser.add_argument('--readers', type=int, default=8, help='Concurrent reader threads')
+        parser.add_argument('--duration', type=float, default=5, help='Seconds per pragma profile')
+        parser.add_argument('--write-batch', type=int, default=50,
+                            help='Products updated per writer transaction')
+        parser.add_argument('--database', default=str(settings.BASE_DIR / 'bench.sqlite3'),
+                            help='SQLite file holding the benchmark dataset')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Reuse an already seeded benchmark database and keep it afterwards')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The read benchmark manages its own SQLite database file.')
+
+        setup_test_environment()
+        connection.settings_dict['TEST']['NAME'] = options['database']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'],
+        )
+        try:
+            if not Product.objects.exists():
+                self.stdout.write(f"Seeding {options['scale']} dataset into {options['database']}...")
+                CatalogSeeder(options['scale'], seed=options['seed']).run()
+
+            results = ConcurrentReadBenchmark(
+                readers=options['readers'],
+                duration=options['duration'],
+                write_batch=options['write_batch'],
+                seed=options['seed'],
+            ).run()
+        finally:
+            connection.creation.destroy_test_db(options['database'], verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.stdout.write(f"{'pragmas':<10}{'reads/s':>10}{'writes/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<10}{result['reads_per_sec']:>10.1f}{result['writes_per_sec']:>10.1f}"
+                f"{result['read_p50_ms'] or 0:>10.2f}{result['read_p99_ms'] or 0:>10.2f}{result['errors']:>8}"
+            )
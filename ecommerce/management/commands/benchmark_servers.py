@@ -0,0 +1,46 @@
+import importlib.util
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce.benchmarks import SERVERS, ServerThroughputBenchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure catalog throughput under uvicorn (ASGI) and gunicorn (WSGI) against the '
+        'configured database; seed it first with seed_catalog'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', action='append', choices=sorted(SERVERS), dest='servers',
+                            help='Only benchmark this server (repeatable)')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds of load per server')
+        parser.add_argument('--concurrency', type=int, default=32, help='Concurrent client connections')
+        parser.add_argument('--workers', type=int, default=1, help='Server worker processes')
+        parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the request mix')
+
+    def handle(self, *args, **options):
+        servers = options['servers'] or sorted(SERVERS)
+        missing = [name for name in servers if importlib.util.find_spec(name) is None]
+        if missing:
+            raise CommandError(f"Install {' and '.join(missing)} to benchmark {', '.join(missing)}.")
+
+        try:
+            benchmark = ServerThroughputBenchmark(
+                duration=options['duration'],
+                concurrency=options['concurrency'],
+                workers=options['workers'],
+                threads=options['threads'],
+                seed=options['seed'],
+            )
+            results = benchmark.run(servers)
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'server':<12}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<12}{result['requests']:>10}{result['errors']:>8}{result['rps']:>10.1f}"
+                f"{result['p50_ms'] or 0:>10.2f}{result['p99_ms'] or 0:>10.2f}"
+            )
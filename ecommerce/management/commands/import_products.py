@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce.imports import ImportFormatError, ProductImporter, read_rows
+from ecommerce.models import Store
+
+
+class Command(BaseCommand):
+    help = 'Create or update a store\'s products from a CSV, JSON or JSON Lines file, matched by SKU'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import (.csv, .json, .jsonl or .ndjson)')
+        parser.add_argument('--store', type=int, required=True, help='Id of the store to import into')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows written per transaction')
+        parser.add_argument('--max-errors', type=int, default=100,
+                            help='Rejected rows to list')
+
+    def handle(self, *args, **options):
+        try:
+            store = Store.objects.get(pk=options['store'])
+        except Store.DoesNotExist:
+            raise CommandError(f"Store {options['store']} does not exist.")
+
+        importer = ProductImporter(store, batch_size=options['batch_size'], max_errors=options['max_errors'])
+        start = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as f:
+                importer.run(read_rows(f, options['path']))
+        except OSError as e:
+            raise CommandError(e)
+        except ImportFormatError as e:
+            raise CommandError(f'{e} ({importer.created} created and {importer.updated} updated before the error)')
+        finally:
+            for row, message in importer.errors:
+                self.stderr.write(f'Row {row}: {message}')
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'{importer.created} created, {importer.updated} updated, {importer.error_count} rejected '
+            f'in {elapsed:.1f}s'
+        ))
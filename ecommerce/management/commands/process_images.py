@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ecommerce.images import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Generate resized renditions for product images uploaded or changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.PRODUCT_IMAGE_BATCH_SIZE,
+                            help='Products processed per batch')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new uploads instead of exiting when none are pending')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep between polls when running with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            processed, failed = process_pending(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Processed {processed} products ({failed} unreadable images)')
+            if processed >= options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ecommerce.models import Cart
+
+
+class Command(BaseCommand):
+    help = 'Delete guest carts whose session can no longer exist (run alongside clearsessions)'
+
+    def handle(self, *args, **options):
+        # A guest cart is only reachable through a session, which expires
+        # SESSION_COOKIE_AGE after it was last written.
+        cutoff = timezone.now() - timedelta(seconds=settings.SESSION_COOKIE_AGE)
+        _, deleted = (
+            Cart.objects.filter(user__isnull=True, created_at__lt=cutoff)
+            .exclude(items__updated_at__gte=cutoff)
+            .delete()
+        )
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted.get('ecommerce.Cart', 0)} abandoned guest carts"))
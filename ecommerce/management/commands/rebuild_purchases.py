@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.purchases import rebuild_purchases
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-buyer purchased products behind verified reviews from all orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows written per INSERT')
+
+    def handle(self, *args, **options):
+        written = rebuild_purchases(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} purchased products'))
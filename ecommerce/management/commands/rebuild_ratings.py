@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized product rating aggregates from all reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Products recomputed per UPDATE statement')
+
+    def handle(self, *args, **options):
+        updated = rebuild_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt ratings for {updated} reviewed products'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.sales import rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups behind the vendor dashboard from all orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rollup rows written per INSERT')
+
+    def handle(self, *args, **options):
+        written = rebuild_daily_sales(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} daily sales rows'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ecommerce.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index from the products table'
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            self.stdout.write(self.style.WARNING(
+                'No FTS5 search index on this database; search uses the icontains fallback.'
+            ))
+            return
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} products'))
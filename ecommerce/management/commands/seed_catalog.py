@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ecommerce.models import User
+from ecommerce.seeding import SCALES, CatalogSeeder
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic catalog (users, stores, products, reviews, orders) in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small',
+                            help='Preset dataset size')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed; the same seed always generates the same data')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows per bulk INSERT and per transaction')
+        for name in SCALES['small']:
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name,
+                                help=f'Override the preset {name.replace("_", " ")}')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username=f"buyer{options['seed']}_0").exists():
+            raise CommandError(f"A dataset with seed {options['seed']} already exists; use another --seed.")
+
+        counts = {name: options[name] for name in SCALES['small'] if options[name] is not None}
+        seeder = CatalogSeeder(
+            options['scale'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            counts=counts,
+            progress=self.report,
+        )
+        created = seeder.run()
+        self.stdout.write(self.style.SUCCESS(
+            'Seeded ' + ', '.join(f'{count} {name}' for name, count in created.items())
+        ))
+
+    def report(self, table, rows, seconds):
+        rate = rows / seconds if seconds else rows
+        self.stdout.write(f'{table}: {rows} rows in {seconds:.1f}s ({rate:,.0f} rows/sec)')
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ecommerce.outbox import deliver_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbox emails (invoices) in batches, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE,
+                            help='Emails sent per mail connection')
+        parser.add_argument('--max-attempts', type=int, default=settings.OUTBOX_MAX_ATTEMPTS,
+                            help='Attempts before an email is marked failed')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new emails instead of exiting when the queue is drained')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep between polls when running with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, retried, failed = deliver_batch(options['batch_size'], options['max_attempts'])
+            if sent or retried or failed:
+                self.stdout.write(f'Sent {sent}, retrying {retried}, failed {failed}')
+            # A full batch means more may be waiting; otherwise the queue is drained.
+            if sent + retried + failed >= options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
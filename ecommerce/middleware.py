@@ -0,0 +1,173 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+
+from .routers import request_routing
+
+logger = logging.getLogger('ecommerce.profiling')
+
+# Seconds spent rendering templates in the current request, or None when not profiling.
+_render_time = ContextVar('render_time', default=None)
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def query_shape(sql):
+    """Normalize SQL so queries differing only in parameters share a shape"""
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    sql = _STRING_RE.sub('?', sql)
+    return _NUMBER_RE.sub('?', sql)
+
+
+def _install_render_timer():
+    """Wrap Django template rendering once so render time can be attributed to requests"""
+    if getattr(Template.render, '_profiled', False):
+        return
+    original_render = Template.render
+
+    def render(self, context=None, request=None):
+        timings = _render_time.get()
+        if timings is None:
+            return original_render(self, context, request)
+        start = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            timings.append(time.perf_counter() - start)
+
+    render._profiled = True
+    Template.render = render
+
+
+class QueryRecorder:
+    """Database execute wrapper that records each query's SQL and duration"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, params, time.perf_counter() - start))
+
+
+class QueryProfilingMiddleware:
+    """
+    Opt-in request profiler (QUERY_PROFILER_ENABLED). Records query count, DB
+    time, duplicate queries and template render time for every request, flags
+    query shapes repeated at least QUERY_PROFILER_N_PLUS_ONE_THRESHOLD times as
+    likely N+1 patterns, and reports them in X-DB-* response headers and one
+    JSON log line on the 'ecommerce.profiling' logger. Works without DEBUG.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_PROFILER_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.QUERY_PROFILER_N_PLUS_ONE_THRESHOLD
+        _install_render_timer()
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        render_timings = []
+        token = _render_time.set(render_timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            _render_time.reset(token)
+        total_time = time.perf_counter() - start
+
+        report = self.build_report(recorder.queries, sum(render_timings), total_time)
+        response['X-DB-Query-Count'] = str(report['queries'])
+        response['X-DB-Time-Ms'] = f"{report['db_ms']:.2f}"
+        response['X-DB-Duplicate-Queries'] = str(report['duplicates'])
+        response['X-DB-N-Plus-One'] = str(len(report['n_plus_one']))
+        response['X-Render-Time-Ms'] = f"{report['render_ms']:.2f}"
+        response['X-Request-Time-Ms'] = f"{report['total_ms']:.2f}"
+
+        report.update(method=request.method, path=request.path, status=response.status_code)
+        level = logging.WARNING if report['n_plus_one'] else logging.INFO
+        logger.log(level, json.dumps(report, default=str))
+        return response
+
+    def build_report(self, queries, render_time, total_time):
+        exact = Counter((sql, repr(params)) for sql, params, _ in queries)
+        shapes = Counter(query_shape(sql) for sql, _, _ in queries)
+        return {
+            'queries': len(queries),
+            'db_ms': sum(duration for _, _, duration in queries) * 1000,
+            'render_ms': render_time * 1000,
+            'total_ms': total_time * 1000,
+            'duplicates': sum(count - 1 for count in exact.values() if count > 1),
+            'n_plus_one': [
+                {'sql': shape, 'count': count}
+                for shape, count in shapes.most_common()
+                if count >= self.threshold
+            ],
+        }
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Read-your-writes for ReplicaRouter: a request that writes sets a
+    REPLICA_STICKY_COOKIE holding the time until which the client's reads stay
+    on the primary, giving the replica REPLICA_STICKY_SECONDS to catch up.
+    Only installed when a replica is configured. Supports sync and async
+    requests, so async views are not pushed through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICA_ALIAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with request_routing(self.pinned(request)) as state:
+            response = self.get_response(request)
+        return self.stick(state, response)
+
+    async def __acall__(self, request):
+        with request_routing(self.pinned(request)) as state:
+            response = await self.get_response(request)
+        return self.stick(state, response)
+
+    def pinned(self, request):
+        try:
+            return float(request.COOKIES.get(settings.REPLICA_STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def stick(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE,
+                str(time.time() + settings.REPLICA_STICKY_SECONDS),
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
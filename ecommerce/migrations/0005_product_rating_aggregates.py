@@ -0,0 +1,45 @@
+# Generated migration for denormalized product rating aggregates
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_ratings(apps, schema_editor):
+    Product = apps.get_model('ecommerce', 'Product')
+    Review = apps.get_model('ecommerce', 'Review')
+    totals = Review.objects.order_by().values('product').annotate(
+        count=Count('id'),
+        total=Sum('rating'),
+        verified=Count('id', filter=Q(is_verified=True)),
+    )
+    for row in totals:
+        Product.objects.filter(pk=row['product']).update(
+            rating_count=row['count'],
+            rating_sum=row['total'],
+            verified_count=row['verified'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0004_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='verified_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
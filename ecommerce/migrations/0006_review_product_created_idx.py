@@ -0,0 +1,16 @@
+# Generated migration for the review listing index
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0005_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', '-created_at'], name='review_product_created_idx'),
+        ),
+    ]
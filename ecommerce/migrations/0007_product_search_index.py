@@ -0,0 +1,35 @@
+# Generated migration for the SQLite FTS5 product search index
+from django.db import migrations, OperationalError
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS ecommerce_product_fts USING fts5("
+            "name, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+    except OperationalError:
+        # SQLite built without FTS5; search falls back to icontains filters.
+        return
+    schema_editor.execute(
+        "INSERT INTO ecommerce_product_fts (rowid, name, description) "
+        "SELECT id, name, description FROM ecommerce_product"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS ecommerce_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0006_review_product_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
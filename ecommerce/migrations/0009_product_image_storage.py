@@ -0,0 +1,18 @@
+# Generated migration for content-addressed product image storage
+import ecommerce.uploads
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0008_product_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Upload a product image', null=True, storage=ecommerce.uploads.product_image_storage, upload_to='products/'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated migration for daily sales rollups
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0010_cart'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='ecommerce.product')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='ecommerce.store')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['store', 'date'], name='daily_sales_store_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'store', 'product'), name='unique_daily_sales')],
+            },
+        ),
+    ]
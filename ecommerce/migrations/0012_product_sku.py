@@ -0,0 +1,21 @@
+# Generated migration for product SKUs
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0011_daily_sales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, help_text='Your stock keeping unit; bulk imports update products by SKU', max_length=64, null=True, verbose_name='SKU'),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('store', 'sku'), name='unique_store_sku'),
+        ),
+    ]
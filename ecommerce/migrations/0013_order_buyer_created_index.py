@@ -0,0 +1,16 @@
+# Generated migration for the buyer order history index
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0012_product_sku'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['buyer', '-created_at', '-id'], name='order_buyer_created_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated migration for indexes behind the hot lookup paths
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0013_order_buyer_created_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['product', 'order'], name='orderitem_product_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passwordresettoken',
+            index=models.Index(condition=models.Q(('used', False)), fields=['user'], name='reset_token_user_unused_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('stock_quantity__gt', 0)), fields=['-created_at', '-id'], name='product_in_stock_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='store',
+            index=models.Index(fields=['vendor', '-created_at'], name='store_vendor_created_idx'),
+        ),
+    ]
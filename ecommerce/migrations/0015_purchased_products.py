@@ -0,0 +1,42 @@
+# Generated migration for per-buyer purchased products
+from itertools import islice
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_purchases(apps, schema_editor):
+    OrderItem = apps.get_model('ecommerce', 'OrderItem')
+    PurchasedProduct = apps.get_model('ecommerce', 'PurchasedProduct')
+    pairs = (
+        PurchasedProduct(buyer_id=buyer_id, product_id=product_id)
+        for buyer_id, product_id in (
+            OrderItem.objects.values_list('order__buyer', 'product').distinct().order_by()
+            .iterator(chunk_size=5000)
+        )
+    )
+    while batch := list(islice(pairs, 5000)):
+        PurchasedProduct.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0014_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchasedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('buyer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchased_products', to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchases', to='ecommerce.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('buyer', 'product'), name='unique_purchased_product')],
+            },
+        ),
+        migrations.RunPython(backfill_purchases, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated migration dropping the order item index made redundant by PurchasedProduct
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0015_purchased_products'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='orderitem',
+            name='orderitem_product_order_idx',
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.db import models
 from django.utils import timezone
 import secrets
 
+from .uploads import product_image_storage
+
 
 class User(AbstractUser):
     """Custom user model with vendor/buyer role"""
@@ -36,6 +38,9 @@ class Store(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['vendor', '-created_at'], name='store_vendor_created_idx'),
+        ]
     
     def __str__(self):
         return self.name
@@ -47,13 +52,38 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock_quantity = models.PositiveIntegerField(default=0)
-    image = models.ImageField(upload_to='products/', blank=True, null=True, help_text='Upload a product image')
+    sku = models.CharField('SKU', max_length=64, blank=True, null=True, help_text='Your stock keeping unit; bulk imports update products by SKU')
+    image = models.ImageField(upload_to='products/', storage=product_image_storage, blank=True, null=True, help_text='Upload a product image')
+    # {width: storage name} of downscaled copies, written by ecommerce.images
+    image_renditions = models.JSONField(default=dict, blank=True)
+    renditions_pending = models.BooleanField(default=False)
     store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='products')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized review aggregates, maintained by ecommerce.ratings
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    verified_count = models.PositiveIntegerField(default=0)
     
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['store', 'sku'], name='unique_store_sku'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            # The home page: in-stock products, newest first
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(stock_quantity__gt=0),
+                name='product_in_stock_created_idx',
+            ),
+            models.Index(
+                fields=['renditions_pending'],
+                condition=models.Q(renditions_pending=True),
+                name='product_renditions_pending_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.store.name}"
@@ -61,11 +91,61 @@ class Product(models.Model):
     def is_in_stock(self):
         return self.stock_quantity > 0
     
+    @property
+    def average_rating(self):
+        """Average review rating, or None if the product has no reviews"""
+        if not self.rating_count:
+            return None
+        return round(self.rating_sum / self.rating_count, 1)
+    
     def get_image_url(self):
         """Return image URL or placeholder"""
         if self.image:
             return self.image.url
         return '/static/images/placeholder-product.png'  # Placeholder image
+    
+    def get_rendition_url(self, width):
+        """
+        URL of the smallest rendition at least `width` pixels wide, else the
+        largest one, else the original upload (None without an image). While
+        renditions are pending the stored ones may belong to a replaced image,
+        so the original is used.
+        """
+        if not self.image:
+            return None
+        renditions = sorted((int(w), name) for w, name in (self.image_renditions or {}).items())
+        if not renditions or self.renditions_pending:
+            return self.image.url
+        for rendition_width, name in renditions:
+            if rendition_width >= width:
+                break
+        return self.image.storage.url(name)
+
+
+class Cart(models.Model):
+    """Shopping cart; a guest's cart has no user and is found through the session"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart', null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Cart #{self.id} - {self.user.username if self.user else 'guest'}"
+
+
+class CartItem(models.Model):
+    """One product line in a cart"""
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cart_items')
+    quantity = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            # Quantity changes are upserts against this constraint
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity}x {self.product.name}"
 
 
 class Order(models.Model):
@@ -77,11 +157,46 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['buyer', '-created_at', '-id'], name='order_buyer_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} - {self.buyer.username}"
 
 
+class OutboxEmail(models.Model):
+    """Email queued in the checkout transaction and delivered by the send_outbox worker"""
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+    
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='outbox_emails', null=True, blank=True)
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} ({self.get_status_display()})"
+
+
 class OrderItem(models.Model):
     """Individual items in an order"""
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -97,6 +212,42 @@ class OrderItem(models.Model):
         return self.price * self.quantity
 
 
+class DailySales(models.Model):
+    """Per-day sales of one product, kept up to date at checkout for the vendor dashboard"""
+    date = models.DateField()
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='daily_sales')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    orders = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'store', 'product'], name='unique_daily_sales'),
+        ]
+        indexes = [
+            models.Index(fields=['store', 'date'], name='daily_sales_store_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.product.name}: {self.units} units"
+
+
+class PurchasedProduct(models.Model):
+    """A product a buyer has ordered at least once, recorded at checkout for verified reviews"""
+    buyer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='purchased_products')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='purchases')
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['buyer', 'product'], name='unique_purchased_product'),
+        ]
+    
+    def __str__(self):
+        return f"{self.buyer.username} bought {self.product.name}"
+
+
 class Review(models.Model):
     """Product review model"""
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
@@ -109,6 +260,9 @@ class Review(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ['product', 'user']  # One review per user per product
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_created_idx'),
+        ]
     
     def __str__(self):
         verified = "✓ Verified" if self.is_verified else "Unverified"
@@ -123,6 +277,11 @@ class PasswordResetToken(models.Model):
     expires_at = models.DateTimeField()
     used = models.BooleanField(default=False)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user'], condition=models.Q(used=False), name='reset_token_user_unused_idx'),
+        ]
+    
     def __str__(self):
         status = "Used" if self.used else "Active"
         return f"Token for {self.user.username} - {status}"
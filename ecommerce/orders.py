@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+
+from .models import Order, OrderItem
+
+
+def summary_cache():
+    return caches[settings.ORDER_SUMMARY_CACHE]
+
+
+def summary_key(buyer_id):
+    return f'order-summary:{buyer_id}'
+
+
+def buyer_orders(buyer):
+    """
+    A buyer's orders with their line and item counts annotated, for keyset
+    pagination on (created_at, id) over the order_buyer_created_idx index.
+    The counts are correlated subqueries rather than a join with GROUP BY, so
+    the rows come out in index order and only the page being shown is counted.
+    """
+    lines = OrderItem.objects.filter(order=OuterRef('pk')).values('order')
+    return Order.objects.filter(buyer=buyer).annotate(
+        line_count=Subquery(lines.annotate(count=Count('pk')).values('count'), output_field=IntegerField()),
+        item_count=Subquery(lines.annotate(items=Sum('quantity')).values('items'), output_field=IntegerField()),
+    )
+
+
+async def aorder_summary(buyer):
+    """
+    Lifetime totals for a buyer ({'orders', 'items', 'spent'}), cached so the
+    order history page does not aggregate every past order on each visit.
+    """
+    cache = summary_cache()
+    key = summary_key(buyer.pk)
+    summary = await cache.aget(key)
+    if summary is None:
+        orders = await Order.objects.filter(buyer=buyer).aaggregate(orders=Count('pk'), spent=Sum('total_amount'))
+        items = await OrderItem.objects.filter(order__buyer=buyer).aaggregate(items=Sum('quantity'))
+        summary = {
+            'orders': orders['orders'],
+            'items': items['items'] or 0,
+            'spent': orders['spent'] or Decimal('0'),
+        }
+        await cache.aset(key, summary, settings.ORDER_SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate_order_summary(buyer_id):
+    summary_cache().delete(summary_key(buyer_id))
@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OutboxEmail
+
+
+def default_from_email():
+    return settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@ecommerce.com'
+
+
+def build_invoice_email(order, items):
+    """Return the (subject, body) of the invoice email for an order"""
+    subject = f'Invoice for Order #{order.id}'
+
+    message = f"""
+    Thank you for your purchase!
+
+    Order Number: #{order.id}
+    Date: {order.created_at.strftime('%Y-%m-%d %H:%M:%S')}
+
+    Items:
+    """
+
+    for item in items:
+        message += f"\n- {item['product'].name} x{item['quantity']} @ ${item['product'].price} = ${item['total']}"
+
+    message += f"\n\nTotal: ${order.total_amount}"
+    message += "\n\nThank you for shopping with us!"
+
+    return subject, message
+
+
+def enqueue_invoice(order, items):
+    """
+    Queue the invoice email for an order. Call inside the checkout transaction
+    so the email exists if and only if the order does.
+    """
+    subject, body = build_invoice_email(order, items)
+    return OutboxEmail.objects.create(
+        order=order,
+        to_email=order.buyer.email,
+        subject=subject,
+        body=body,
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff after the given number of failed attempts"""
+    base = settings.OUTBOX_RETRY_BACKOFF
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), settings.OUTBOX_MAX_BACKOFF))
+
+
+def claim_batch(batch_size):
+    """
+    Claim up to batch_size due emails by pushing their next attempt past the
+    lease window, so a concurrent worker does not pick up the same rows.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if batch:
+            OutboxEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+            )
+    return batch
+
+
+def deliver_batch(batch_size=None, max_attempts=None):
+    """
+    Send one batch of due outbox emails over a single mail connection.
+
+    Returns (sent, retried, failed) counts. Emails that fail are rescheduled
+    with exponential backoff until max_attempts, then marked failed.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    max_attempts = max_attempts or settings.OUTBOX_MAX_ATTEMPTS
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0, 0
+
+    sent = set()
+    retried = []
+    failed = []
+    from_email = default_from_email()
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # Nothing can be sent this round; count it as an attempt for every email.
+        for email in batch:
+            email.last_error = str(e)
+        connection = None
+
+    if connection is not None:
+        try:
+            for email in batch:
+                message = EmailMessage(
+                    email.subject, email.body, from_email, [email.to_email],
+                    connection=connection,
+                )
+                try:
+                    message.send()
+                    sent.add(email.pk)
+                except Exception as e:
+                    email.last_error = str(e)
+        finally:
+            connection.close()
+
+    now = timezone.now()
+    for email in batch:
+        if email.pk in sent:
+            email.status = OutboxEmail.SENT
+            email.sent_at = now
+            email.last_error = ''
+            continue
+        email.attempts += 1
+        if email.attempts >= max_attempts:
+            email.status = OutboxEmail.FAILED
+            failed.append(email)
+        else:
+            email.next_attempt_at = now + retry_delay(email.attempts)
+            retried.append(email)
+
+    with transaction.atomic():
+        OutboxEmail.objects.bulk_update(
+            batch, ['status', 'sent_at', 'attempts', 'next_attempt_at', 'last_error']
+        )
+        order_ids = [email.order_id for email in batch if email.pk in sent and email.order_id]
+        if order_ids:
+            Order.objects.filter(pk__in=order_ids).update(invoice_sent=True)
+
+    return len(sent), len(retried), len(failed)
@@ -0,0 +1,127 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class KeysetPage:
+    """A single page of keyset-paginated results"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def encode_cursor(obj, field='created_at'):
+    """Encode the (timestamp, id) position of an object as an opaque cursor"""
+    raw = f"{getattr(obj, field).isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into a (timestamp, id) tuple, or None if it is invalid"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset newest-first on (field, id) using cursors instead of
+    OFFSET, so every page is a bounded range scan on a (field, id) index.
+    """
+
+    def __init__(self, queryset, page_size, field='created_at'):
+        self.queryset = queryset
+        self.page_size = page_size
+        self.field = field
+
+    def page(self, after=None, before=None):
+        """Return the page after or before the given cursor (first page if neither)"""
+        queryset, after_key, backwards = self.plan(after, before)
+        rows = list(queryset[:self.page_size + 1])
+        if backwards and not rows:
+            return self.page()
+        return self.build(rows, after_key, backwards)
+
+    async def apage(self, after=None, before=None):
+        """page() for async views, fetching the rows with async iteration"""
+        queryset, after_key, backwards = self.plan(after, before)
+        rows = [row async for row in queryset[:self.page_size + 1]]
+        if backwards and not rows:
+            return await self.apage()
+        return self.build(rows, after_key, backwards)
+
+    def plan(self, after, before):
+        """Return (queryset, after_key, backwards) for the requested page"""
+        field = self.field
+        after_key = decode_cursor(after)
+        before_key = decode_cursor(before) if after_key is None else None
+
+        if before_key is not None:
+            timestamp, pk = before_key
+            queryset = self.queryset.filter(
+                Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'pk__gt': pk})
+            ).order_by(field, 'pk')
+            return queryset, None, True
+
+        queryset = self.queryset
+        if after_key is not None:
+            timestamp, pk = after_key
+            queryset = queryset.filter(
+                Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'pk__lt': pk})
+            )
+        return queryset.order_by(f'-{field}', '-pk'), after_key, False
+
+    def build(self, rows, after_key, backwards):
+        """Turn up to page_size + 1 fetched rows into a KeysetPage"""
+        field = self.field
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+            return KeysetPage(
+                rows,
+                next_cursor=encode_cursor(rows[-1], field),
+                previous_cursor=encode_cursor(rows[0], field) if has_more else None,
+            )
+        return KeysetPage(
+            rows,
+            next_cursor=encode_cursor(rows[-1], field) if has_more else None,
+            previous_cursor=encode_cursor(rows[0], field) if after_key is not None and rows else None,
+        )
+
+
+def get_page_size(request, default, maximum):
+    """Read a page size from the query string, clamped to [1, maximum]"""
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, maximum))
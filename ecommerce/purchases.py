@@ -0,0 +1,44 @@
+from itertools import islice
+
+from django.db import transaction
+
+from .models import OrderItem, PurchasedProduct
+
+
+def record_purchases(buyer, items):
+    """
+    Remember the products in a new order as purchased by its buyer, with one
+    INSERT that skips products they have bought before. Runs inside the
+    checkout transaction.
+    """
+    PurchasedProduct.objects.bulk_create(
+        [PurchasedProduct(buyer=buyer, product=item['product']) for item in items],
+        ignore_conflicts=True,
+    )
+
+
+def has_purchased(buyer, product_id):
+    """Whether the buyer has ever ordered the product: one unique-index lookup"""
+    return PurchasedProduct.objects.filter(buyer=buyer, product_id=product_id).exists()
+
+
+def rebuild_purchases(batch_size=5000):
+    """
+    Recompute every buyer's purchased products from the order history and
+    return the number of rows written. Use after orders are imported or
+    deleted outside checkout.
+    """
+    pairs = (
+        PurchasedProduct(buyer_id=buyer_id, product_id=product_id)
+        for buyer_id, product_id in (
+            OrderItem.objects.values_list('order__buyer', 'product').distinct().order_by()
+            .iterator(chunk_size=batch_size)
+        )
+    )
+    written = 0
+    with transaction.atomic():
+        PurchasedProduct.objects.all().delete()
+        while batch := list(islice(pairs, batch_size)):
+            PurchasedProduct.objects.bulk_create(batch)
+            written += len(batch)
+    return written
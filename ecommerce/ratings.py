@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Product, Review
+
+
+def apply_review_change(product_id, old=None, new=None):
+    """
+    Incrementally update a product's rating aggregates.
+
+    old and new are (rating, is_verified) tuples describing the review before
+    and after the change; pass None for old when a review is created and None
+    for new when it is deleted.
+    """
+    count_delta = sum_delta = verified_delta = 0
+    if old is not None:
+        count_delta -= 1
+        sum_delta -= old[0]
+        verified_delta -= int(old[1])
+    if new is not None:
+        count_delta += 1
+        sum_delta += new[0]
+        verified_delta += int(new[1])
+    if not (count_delta or sum_delta or verified_delta):
+        return
+
+    Product.objects.filter(pk=product_id).update(
+        rating_count=F('rating_count') + count_delta,
+        rating_sum=F('rating_sum') + sum_delta,
+        verified_count=F('verified_count') + verified_delta,
+    )
+
+
+def rebuild_ratings(batch_size=10000):
+    """
+    Recompute every product's rating aggregates from the reviews table, one
+    UPDATE per pk range of batch_size products. Returns the number of products
+    that have reviews.
+    """
+    def aggregate(expression):
+        return Coalesce(Subquery(
+            Review.objects.filter(product=OuterRef('pk'))
+            .order_by()
+            .values('product')
+            .annotate(value=expression)
+            .values('value')
+        ), 0)
+
+    bounds = Product.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0
+    for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+        with transaction.atomic():
+            Product.objects.filter(pk__gte=start, pk__lt=start + batch_size).update(
+                rating_count=aggregate(Count('id')),
+                rating_sum=aggregate(Sum('rating')),
+                verified_count=aggregate(Count('id', filter=Q(is_verified=True))),
+            )
+    return Product.objects.filter(rating_count__gt=0).count()
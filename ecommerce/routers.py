@@ -0,0 +1,108 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Apps whose rows are per-visitor state that must be read back immediately;
+# they always use the primary and writing them does not pin the request.
+PRIMARY_ONLY_APPS = {'sessions'}
+
+
+class RoutingState:
+    """Per-request routing flags shared by the router, middleware and views"""
+
+    def __init__(self, pinned=False):
+        # The client wrote recently, so replica lag could hide its own changes
+        self.pinned = pinned
+        # The current code has opted in to replica reads
+        self.replica = False
+        # A write happened during this request
+        self.wrote = False
+
+
+_state = ContextVar('db_routing', default=None)
+
+
+def routing_state():
+    return _state.get()
+
+
+@contextmanager
+def request_routing(pinned=False):
+    """Track reads and writes for one request"""
+    token = _state.set(RoutingState(pinned))
+    try:
+        yield _state.get()
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def replica_reads():
+    """Let reads inside the block go to the replica, unless the request is pinned to the primary"""
+    state = _state.get()
+    token = None
+    if state is None:
+        token = _state.set(RoutingState())
+        state = _state.get()
+    previous = state.replica
+    state.replica = True
+    try:
+        yield
+    finally:
+        state.replica = previous
+        if token is not None:
+            _state.reset(token)
+
+
+def read_from_replica(view):
+    """View decorator: serve the view's reads from the replica (sync or async views)"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with replica_reads():
+                return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Send reads to DATABASE_REPLICA_ALIAS only inside replica_reads() and only
+    while the request has not written (in this request or, through
+    ReplicaRoutingMiddleware, in the last REPLICA_STICKY_SECONDS). Everything
+    else, including every write, uses the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = settings.DATABASE_REPLICA_ALIAS
+        state = _state.get()
+        if (
+            alias and state is not None and state.replica and not state.pinned and not state.wrote
+            and model._meta.app_label not in PRIMARY_ONLY_APPS
+        ):
+            return alias
+        # Explicit, so related lookups on replica-loaded objects do not follow them there
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema from the primary
+        if db == settings.DATABASE_REPLICA_ALIAS:
+            return False
+        return None
@@ -0,0 +1,124 @@
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySales, OrderItem
+
+
+def record_sale(order, items):
+    """
+    Add an order's lines to the DailySales rows for the day it was placed.
+
+    Runs inside the checkout transaction after the stock UPDATE, which holds
+    locks on the products involved, so reading the current rows and writing
+    the new totals with one upsert cannot race another checkout of the same
+    products.
+    """
+    date = timezone.localdate(order.created_at)
+    existing = {
+        (row.store_id, row.product_id): row
+        for row in DailySales.objects.filter(date=date, product_id__in=[item['product'].pk for item in items])
+    }
+    rows = []
+    for item in items:
+        product = item['product']
+        row = existing.get((product.store_id, product.pk))
+        rows.append(DailySales(
+            date=date,
+            store_id=product.store_id,
+            product_id=product.pk,
+            units=item['quantity'] + (row.units if row else 0),
+            revenue=item['total'] + (row.revenue if row else 0),
+            orders=1 + (row.orders if row else 0),
+        ))
+    DailySales.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['date', 'store', 'product'],
+        update_fields=['units', 'revenue', 'orders'],
+    )
+
+
+def rebuild_daily_sales(batch_size=5000):
+    """
+    Recompute every DailySales row from the order history and return the
+    number of rows written. Sales are attributed to each product's current
+    store.
+    """
+    totals = (
+        OrderItem.objects
+        .annotate(date=TruncDate('order__created_at'))
+        .values('date', 'product__store', 'product')
+        .annotate(
+            units=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2)),
+            orders=Count('order', distinct=True),
+        )
+        .order_by()
+    )
+    rows = (
+        DailySales(
+            date=total['date'],
+            store_id=total['product__store'],
+            product_id=total['product'],
+            units=total['units'],
+            revenue=total['revenue'],
+            orders=total['orders'],
+        )
+        for total in totals.iterator(chunk_size=batch_size)
+    )
+    written = 0
+    with transaction.atomic():
+        DailySales.objects.all().delete()
+        while batch := list(islice(rows, batch_size)):
+            DailySales.objects.bulk_create(batch)
+            written += len(batch)
+    return written
+
+
+def vendor_sales(vendor, days=30):
+    """
+    Dashboard figures for a vendor's last `days` days, read only from
+    DailySales: per-day totals (with bar heights as a percentage of the best
+    day), overall totals and the best-selling stores and products.
+    """
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    rows = DailySales.objects.filter(store__vendor=vendor, date__gte=start)
+
+    by_day = {
+        row['date']: row
+        for row in rows.values('date').annotate(revenue=Sum('revenue'), units=Sum('units')).order_by()
+    }
+    best = max((row['revenue'] for row in by_day.values()), default=0)
+    daily = []
+    for offset in range(days):
+        date = start + timedelta(days=offset)
+        row = by_day.get(date, {})
+        revenue = row.get('revenue') or Decimal('0')
+        daily.append({
+            'date': date,
+            'revenue': revenue,
+            'units': row.get('units') or 0,
+            'percent': round(revenue / best * 100) if best else 0,
+        })
+
+    return {
+        'days': days,
+        'daily': daily,
+        'revenue': sum(day['revenue'] for day in daily),
+        'units': sum(day['units'] for day in daily),
+        # Grouped by id so stores or products that share a name stay separate
+        'stores': rows.values('store').annotate(
+            name=F('store__name'), revenue=Sum('revenue'), units=Sum('units'),
+        ).order_by('-revenue'),
+        'products': rows.values('product').annotate(
+            name=F('product__name'), store_name=F('store__name'),
+            revenue=Sum('revenue'), units=Sum('units'), orders=Sum('orders'),
+        ).order_by('-revenue')[:10],
+    }
@@ -0,0 +1,147 @@
+"""
+Product full-text search.
+
+On SQLite, products are indexed in an FTS5 table (created by migration 0007)
+whose rowid is the product id. The index is kept in sync by the post_save and
+post_delete receivers in ecommerce.signals and can be rebuilt with
+`manage.py rebuild_search_index`. Other backends, or SQLite builds without
+FTS5, fall back to icontains filters.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Product
+
+FTS_TABLE = 'ecommerce_product_fts'
+
+# Name matches rank well above description matches.
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_fts_available = {}
+
+
+def fts_available():
+    """Whether the FTS5 index exists on the current database (checked once per database)"""
+    key = (connection.alias, str(connection.settings_dict['NAME']))
+    if key not in _fts_available:
+        _fts_available[key] = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available[key]
+
+
+def tokenize(query):
+    """Split a user query into plain word tokens"""
+    return _TOKEN_RE.findall(query.lower())
+
+
+def build_match_expression(tokens):
+    """Build an FTS5 MATCH expression that ANDs every token as a prefix"""
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def index_product(product):
+    """Add or refresh a product in the search index"""
+    index_products([product])
+
+
+def index_products(products):
+    """Add or refresh several products in the search index, e.g. after a bulk write"""
+    if not fts_available() or not products:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [[product.pk] for product in products])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+            [[product.pk, product.name, product.description] for product in products],
+        )
+
+
+def unindex_product(product_id):
+    """Remove a product from the search index"""
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+
+def rebuild_index():
+    """Rebuild the whole search index from the products table; returns the row count"""
+    if not fts_available():
+        return 0
+    product_table = Product._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+            f'SELECT id, name, description FROM {product_table}'
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def search_products(query, store_id=None, min_price=None, max_price=None, limit=50):
+    """
+    Return up to `limit` products matching every word of `query` (as prefixes),
+    best matches first, optionally filtered by store and price range.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    if fts_available():
+        return _search_fts(tokens, store_id, min_price, max_price, limit)
+    return _search_fallback(tokens, store_id, min_price, max_price, limit)
+
+
+def _search_fts(tokens, store_id, min_price, max_price, limit):
+    product_table = Product._meta.db_table
+    where = [f'{FTS_TABLE} MATCH %s']
+    params = [build_match_expression(tokens)]
+    if store_id is not None:
+        where.append('p.store_id = %s')
+        params.append(store_id)
+    if min_price is not None:
+        where.append('p.price >= %s')
+        params.append(min_price)
+    if max_price is not None:
+        where.append('p.price <= %s')
+        params.append(max_price)
+    params.append(limit)
+
+    sql = (
+        f'SELECT p.id FROM {FTS_TABLE} '
+        f'JOIN {product_table} p ON p.id = {FTS_TABLE}.rowid '
+        f'WHERE {" AND ".join(where)} '
+        f'ORDER BY bm25({FTS_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT}) '
+        f'LIMIT %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        ids = [row[0] for row in cursor.fetchall()]
+
+    products = Product.objects.select_related('store').in_bulk(ids)
+    return [products[product_id] for product_id in ids if product_id in products]
+
+
+def _search_fallback(tokens, store_id, min_price, max_price, limit):
+    products = Product.objects.select_related('store')
+    name_match = Q()
+    for token in tokens:
+        products = products.filter(Q(name__icontains=token) | Q(description__icontains=token))
+        name_match &= Q(name__icontains=token)
+    if store_id is not None:
+        products = products.filter(store_id=store_id)
+    if min_price is not None:
+        products = products.filter(price__gte=min_price)
+    if max_price is not None:
+        products = products.filter(price__lte=max_price)
+    products = products.annotate(
+        name_rank=Case(When(name_match, then=Value(0)), default=Value(1), output_field=IntegerField())
+    ).order_by('name_rank', '-created_at')
+    return list(products[:limit])
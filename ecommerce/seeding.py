@@ -0,0 +1,219 @@
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import User, Store, Product, Order, OrderItem, Review
+from .purchases import rebuild_purchases
+from .ratings import rebuild_ratings
+from .sales import rebuild_daily_sales
+from . import search
+
+# Row counts per dataset size. reviews_per_product and items_per_order are maxima.
+SCALES = {
+    'tiny': {
+        'vendors': 3, 'stores': 5, 'products': 200, 'buyers': 50,
+        'reviews_per_product': 3, 'orders': 200, 'items_per_order': 3,
+    },
+    'small': {
+        'vendors': 25, 'stores': 50, 'products': 5_000, 'buyers': 1_000,
+        'reviews_per_product': 6, 'orders': 5_000, 'items_per_order': 4,
+    },
+    'large': {
+        'vendors': 1_000, 'stores': 2_000, 'products': 100_000, 'buyers': 50_000,
+        'reviews_per_product': 30, 'orders': 1_000_000, 'items_per_order': 5,
+    },
+}
+
+SEED_PASSWORD = 'password'
+
+ADJECTIVES = [
+    'Wireless', 'Compact', 'Deluxe', 'Organic', 'Vintage', 'Smart', 'Portable', 'Ergonomic',
+    'Waterproof', 'Handmade', 'Premium', 'Classic', 'Lightweight', 'Rechargeable', 'Eco',
+]
+NOUNS = [
+    'Headphones', 'Backpack', 'Coffee Mug', 'Desk Lamp', 'Yoga Mat', 'Water Bottle', 'Keyboard',
+    'Sneakers', 'Notebook', 'Sunglasses', 'Blender', 'Phone Case', 'Wallet', 'Throw Blanket',
+    'Speaker', 'Watch', 'Chair', 'Candle', 'Jacket', 'Teapot',
+]
+STORE_WORDS = ['Outlet', 'Market', 'Emporium', 'Depot', 'Boutique', 'Supply Co.', 'Corner', 'House']
+REVIEW_COMMENTS = {
+    1: ['Broke after a week.', 'Not as described.', 'Would not buy again.'],
+    2: ['Disappointing quality.', 'Works, barely.', 'Expected more for the price.'],
+    3: ['It is okay.', 'Does the job.', 'Average, nothing special.'],
+    4: ['Very good, minor issues.', 'Happy with it.', 'Good value for money.'],
+    5: ['Excellent!', 'Exactly what I needed.', 'Highly recommend.'],
+}
+
+
+def batched(iterable, size):
+    """Yield lists of up to size items from an iterable without materializing it"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class CatalogSeeder:
+    """
+    Deterministically generate users, stores, products, reviews and orders.
+
+    Rows are produced by generators and written with bulk_create, one
+    transaction per batch, so memory stays flat apart from the id lists
+    needed for foreign keys.
+    """
+
+    def __init__(self, scale='small', seed=0, batch_size=2000, counts=None, progress=None):
+        self.counts = dict(SCALES[scale], **(counts or {}))
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        # Called as progress(table, rows, seconds) after each table is written
+        self.progress = progress
+        self.password = make_password(SEED_PASSWORD)
+        self.vendor_ids = []
+        self.buyer_ids = []
+        self.store_ids = []
+        self.product_prices = []
+
+    def run(self):
+        """Seed every table; returns {model name: rows created}"""
+        created = {
+            'users': self.write('users', User, self.generate_users()),
+            'stores': self.write('stores', Store, self.generate_stores()),
+            'products': self.write('products', Product, self.generate_products()),
+            'reviews': self.write('reviews', Review, self.generate_reviews()),
+        }
+        created['orders'], created['order_items'] = self.write_orders()
+        start = time.perf_counter()
+        rebuild_ratings()
+        search.rebuild_index()
+        self.report('rating and search indexes', created['products'], start)
+        start = time.perf_counter()
+        self.report('daily sales rollups', rebuild_daily_sales(self.batch_size), start)
+        start = time.perf_counter()
+        self.report('purchased products', rebuild_purchases(self.batch_size), start)
+        return created
+
+    def report(self, table, rows, start):
+        if self.progress:
+            self.progress(table, rows, time.perf_counter() - start)
+
+    def write(self, table, model, rows):
+        start = time.perf_counter()
+        count = 0
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                objects = model.objects.bulk_create(batch)
+            self.created(model, objects)
+            count += len(objects)
+        self.report(table, count, start)
+        return count
+
+    def created(self, model, objects):
+        """Remember ids of rows other tables point at"""
+        if model is User:
+            for user in objects:
+                (self.vendor_ids if user.role == User.VENDOR else self.buyer_ids).append(user.pk)
+        elif model is Store:
+            self.store_ids.extend(store.pk for store in objects)
+        elif model is Product:
+            self.product_prices.extend((product.pk, product.price) for product in objects)
+
+    def generate_users(self):
+        for role, prefix, count in (
+            (User.VENDOR, 'vendor', self.counts['vendors']),
+            (User.BUYER, 'buyer', self.counts['buyers']),
+        ):
+            for i in range(count):
+                # The seed is part of the name so datasets with different seeds can coexist.
+                username = f'{prefix}{self.seed}_{i}'
+                yield User(
+                    username=username,
+                    email=f'{username}@example.com',
+                    password=self.password,
+                    role=role,
+                )
+
+    def generate_stores(self):
+        rng = self.rng
+        for i in range(self.counts['stores']):
+            noun = rng.choice(NOUNS)
+            yield Store(
+                name=f'{rng.choice(ADJECTIVES)} {noun} {rng.choice(STORE_WORDS)} #{i}',
+                description=f'Independent seller of {noun.lower()}s and accessories.',
+                vendor_id=self.vendor_ids[i % len(self.vendor_ids)],
+            )
+
+    def generate_products(self):
+        rng = self.rng
+        for i in range(self.counts['products']):
+            adjective, noun = rng.choice(ADJECTIVES), rng.choice(NOUNS)
+            # Log-uniform prices: many cheap products, a long tail of expensive ones
+            price = Decimal(round(10 ** rng.uniform(0, 3.5), 2)).quantize(Decimal('0.01'))
+            yield Product(
+                name=f'{adjective} {noun} {i}',
+                description=(
+                    f'A {adjective.lower()} {noun.lower()} built for everyday use. '
+                    f'Model {rng.randint(100, 999)}-{rng.choice("ABCDEFGH")}, '
+                    f'{rng.choice(["one", "two", "three"])} year warranty.'
+                ),
+                price=max(price, Decimal('0.99')),
+                # About one in ten products is sold out
+                stock_quantity=0 if rng.random() < 0.1 else rng.randint(1, 1_000),
+                store_id=self.store_ids[i % len(self.store_ids)],
+            )
+
+    def generate_reviews(self):
+        rng = self.rng
+        most = min(self.counts['reviews_per_product'], len(self.buyer_ids))
+        for product_id, _ in self.product_prices:
+            for buyer_id in rng.sample(self.buyer_ids, rng.randint(0, most)):
+                # Ratings skew positive, as they do on real storefronts
+                rating = rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 2, 4, 6])[0]
+                yield Review(
+                    product_id=product_id,
+                    user_id=buyer_id,
+                    rating=rating,
+                    comment=rng.choice(REVIEW_COMMENTS[rating]),
+                    is_verified=rng.random() < 0.5,
+                )
+
+    def generate_orders(self):
+        """Yield (order, items) pairs"""
+        rng = self.rng
+        for _ in range(self.counts['orders']):
+            lines = rng.sample(self.product_prices, rng.randint(1, self.counts['items_per_order']))
+            items = [
+                OrderItem(product_id=product_id, quantity=rng.randint(1, 3), price=price)
+                for product_id, price in lines
+            ]
+            order = Order(
+                buyer_id=rng.choice(self.buyer_ids),
+                total_amount=sum(item.price * item.quantity for item in items),
+                invoice_sent=True,
+            )
+            yield order, items
+
+    def write_orders(self):
+        start = time.perf_counter()
+        orders = items = 0
+        for batch in batched(self.generate_orders(), self.batch_size):
+            with transaction.atomic():
+                created = Order.objects.bulk_create([order for order, _ in batch])
+                order_items = []
+                for order, (_, lines) in zip(created, batch):
+                    for item in lines:
+                        item.order_id = order.pk
+                        order_items.append(item)
+                OrderItem.objects.bulk_create(order_items, batch_size=self.batch_size)
+            orders += len(created)
+            items += len(order_items)
+        self.report('orders and order items', orders + items, start)
+        return orders, items
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cart import SessionCart, can_shop
+from .fragments import invalidate_product_cards
+from .models import Product, Store
+from . import search
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    """Keep the search index in sync when a product's text changes"""
+    if update_fields is not None and not {'name', 'description'} & set(update_fields):
+        return
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.unindex_product(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_card(sender, instance, **kwargs):
+    invalidate_product_cards([instance.pk])
+
+
+@receiver(post_save, sender=Store)
+def invalidate_store_product_cards(sender, instance, created, **kwargs):
+    """Product cards show the store name; deleting a store cascades to product deletes"""
+    if not created:
+        invalidate_product_cards(instance.products.values_list('pk', flat=True))
+
+
+@receiver(user_logged_in)
+def merge_guest_cart(sender, request, user, **kwargs):
+    if can_shop(user) and hasattr(request, 'session'):
+        SessionCart(request, user).merge_guest_cart()
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    """Apply SQLITE_PRAGMAS to each new SQLite connection"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
@@ -0,0 +1,44 @@
+from django import template
+
+register = template.Library()
+
+
+class CachedCardNode(template.Node):
+    def __init__(self, nodelist, product, card_cache):
+        self.nodelist = nodelist
+        self.product = product
+        self.card_cache = card_cache
+
+    def render(self, context):
+        product = self.product.resolve(context)
+        card_cache = self.card_cache.resolve(context, ignore_failures=True)
+        if card_cache is None:
+            return self.nodelist.render(context)
+        html = card_cache.get(product)
+        if html is None:
+            html = self.nodelist.render(context)
+            card_cache.set(product, html)
+        return html
+
+
+@register.tag
+def cachedcard(parser, token):
+    """
+    Cache the enclosed product-card markup per product:
+
+        {% cachedcard product card_cache %} ... {% endcachedcard %}
+
+    card_cache is an ecommerce.fragments.ProductCardCache built by the view.
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a product and a card cache")
+    nodelist = parser.parse(('endcachedcard',))
+    parser.delete_first_token()
+    return CachedCardNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
+
+
+@register.filter
+def rendition(product, width):
+    """URL of the smallest product image rendition covering `width` pixels"""
+    return product.get_rendition_url(int(width))
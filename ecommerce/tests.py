@@ -1,8 +1,1140 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import SkipFile
+from django.contrib.messages import get_messages
+from django.contrib.sessions.models import Session
+from django.core.management import CommandError, call_command
+from django.db import connection, OperationalError
+from django.db.models import Count, F, Q, Sum
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from PIL import Image
 
+from .benchmarks import check_baseline, compare, load_baseline, percentile, save_baseline, set_cart
+from .checkout import CheckoutError, StockConflict, place_order
+from .exports import EXPORT_COLUMNS, VENDOR_EXPORT_COLUMNS, order_lines
+from .models import (
+    User, Store, Product, Cart, CartItem, DailySales, Order, OrderItem, OutboxEmail, PasswordResetToken,
+    PurchasedProduct, Review,
+)
+from .fragments import ProductCardCache
+from .images import process_pending, process_product
+from .imports import read_json
+from .middleware import ReplicaRoutingMiddleware
+from .orders import buyer_orders
+from .outbox import deliver_batch
+from .pagination import KeysetPaginator, encode_cursor
+from .routers import ReplicaRouter, replica_reads, routing_state
+from .sales import vendor_sales
+from .search import FTS_TABLE, search_products
+from .seeding import SCALES
+from .uploads import ImageUploadHandler
 
 
+def make_catalog(stock=10, products=1):
+    """Create a vendor, a store and some products for checkout tests"""
+    vendor = User.objects.create_user('vendor', 'vendor@example.com', 'password', role=User.VENDOR)
+    store = Store.objects.create(name='Store', vendor=vendor)
+    return [
+        Product.objects.create(
+            name=f'Product {i}', description='Description', price='9.99',
+            stock_quantity=stock, store=store,
+        )
+        for i in range(products)
+    ]
 
 
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+def product_names_view(request):
+    """Deliberate N+1 for the profiler tests: one product query per order line"""
+    return HttpResponse(', '.join(item.product.name for item in OrderItem.objects.all()))
+
+
+urlpatterns = [
+    path('product-names/', product_names_view),
+    path('', include('ecommerce.urls')),
+]
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class PlaceOrderTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog(stock=5, products=3)
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+
+    def test_creates_order_and_decrements_stock(self):
+        cart = {str(product.id): 2 for product in self.products}
+        order, items = place_order(self.buyer, cart)
+
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(len(items), 3)
+        for product in self.products:
+            product.refresh_from_db()
+            self.assertEqual(product.stock_quantity, 3)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        cart = {str(product.id): 1 for product in self.products}
+        # savepoint, locked fetch, stock update, order/items/outbox inserts,
+        # rollup read and upsert, purchased products insert, release
+        with self.assertNumQueries(10):
+            place_order(self.buyer, cart)
+
+    def test_insufficient_stock_writes_nothing(self):
+        cart = {str(self.products[0].id): 1, str(self.products[1].id): 6}
+        with self.assertRaises(CheckoutError) as ctx:
+            place_order(self.buyer, cart)
+
+        self.assertIn('Only 5 Product 1 available.', ctx.exception.errors)
+        self.assertFalse(Order.objects.exists())
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock_quantity, 5)
+
+    def test_stock_conflict_rolls_back(self):
+        product = self.products[0]
+        stale = Product.objects.get(pk=product.pk)
+        # Another checkout takes the stock after this one has read the row.
+        Product.objects.filter(pk=product.pk).update(stock_quantity=1)
+
+        with mock.patch.object(Product.objects, 'select_for_update') as select_for_update:
+            select_for_update.return_value.in_bulk.return_value = {product.pk: stale}
+            with self.assertRaises(StockConflict):
+                place_order(self.buyer, {str(product.id): 5})
+
+        self.assertFalse(Order.objects.exists())
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 1)
+
+
+class HomePageTests(TestCase):
+    def setUp(self):
+        products = make_catalog(products=7)
+        now = timezone.now()
+        # Pairs share a timestamp, so the id tie-break is exercised too
+        for i, product in enumerate(products):
+            Product.objects.filter(pk=product.pk).update(created_at=now - timedelta(minutes=i // 2))
+        self.expected = list(
+            Product.objects.order_by('-created_at', '-pk').values_list('pk', flat=True)
+        )
+
+    def ids(self, response):
+        return [product.pk for product in response.context['products']]
+
+    def test_cursors_walk_the_catalog_without_repeats_or_gaps(self):
+        pages = []
+        response = self.client.get('/?page_size=3')
+        while True:
+            pages.append(self.ids(response))
+            page = response.context['page']
+            if not page.has_next:
+                break
+            response = self.client.get(f'/?page_size=3&after={page.next_cursor}')
+        self.assertEqual([len(ids) for ids in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        backwards = [self.ids(response)]
+        while response.context['page'].has_previous:
+            response = self.client.get(f'/?page_size=3&before={response.context["page"].previous_cursor}')
+            backwards.append(self.ids(response))
+        self.assertEqual(backwards[::-1], pages)
+
+    def test_page_size_is_clamped(self):
+        for value, expected in [('1000', settings.CATALOG_MAX_PAGE_SIZE), ('0', 1), ('x', settings.CATALOG_PAGE_SIZE)]:
+            response = self.client.get(f'/?page_size={value}')
+            self.assertEqual(response.context['page_size'], expected)
+        self.assertEqual(len(self.ids(self.client.get('/?page_size=-5'))), 1)
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        for query in ['after=not-a-cursor', 'before=%%%', 'after=MjAyNHxhYmM']:
+            response = self.client.get(f'/?page_size=3&{query}')
+            self.assertEqual(self.ids(response), self.expected[:3])
+            self.assertFalse(response.context['page'].has_previous)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class CartViewTests(TestCase):
+    def setUp(self):
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.client.force_login(self.buyer)
+
+    def fill_cart(self, products):
+        set_cart(self.buyer, {str(product.id): 1 for product in products})
+
+    def cart_queries(self, products):
+        self.fill_cart(products)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/cart/')
+        self.assertEqual(len(response.context['cart_items']), len(products))
+        return len(ctx)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        products = make_catalog(products=12)
+        self.assertEqual(self.cart_queries(products[:2]), self.cart_queries(products))
+
+    def test_prunes_missing_and_out_of_stock_products(self):
+        products = make_catalog(products=3)
+        self.fill_cart(products)
+        products[0].delete()
+        Product.objects.filter(pk=products[1].pk).update(stock_quantity=0)
+
+        response = self.client.get('/cart/')
+
+        self.assertEqual([item['product'] for item in response.context['cart_items']], [products[2]])
+        self.assertEqual(
+            list(CartItem.objects.filter(cart__user=self.buyer).values_list('product', 'quantity')),
+            [(products[2].id, 1)],
+        )
+
+    def test_read_only_page_views_do_not_touch_session_table(self):
+        products = make_catalog(products=2)
+        for product in (products[0], products[0], products[1]):
+            self.client.get(f'/cart/add/{product.id}/')
+        self.client.get('/cart/')  # Consume the flash messages
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/')
+
+        self.assertEqual(response.context['cart_count'], 3)
+        self.assertEqual(self.client.session['cart_count'], 3)
+        self.assertFalse([q for q in ctx.captured_queries if 'django_session' in q['sql']])
+
+    def test_guest_without_cart_gets_no_session(self):
+        make_catalog()
+        self.client.logout()
+
+        for url in ['/', '/', '/cart/']:
+            response = self.client.get(url)
+            self.assertEqual(response.context['cart_count'], 0)
+
+        self.assertFalse(Session.objects.exists())
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+
+    def test_guest_cart_merges_into_buyer_cart_at_login(self):
+        products = make_catalog(products=3)
+        set_cart(self.buyer, {str(products[0].id): 2, str(products[1].id): 1})
+        self.client.logout()
+
+        for product in (products[1], products[2], products[2]):
+            self.client.get(f'/cart/add/{product.id}/')
+        self.assertEqual(Cart.objects.filter(user__isnull=True).count(), 1)
+
+        self.client.post('/login/', {'username': 'buyer', 'password': 'password'})
+
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart__user=self.buyer).values_list('product', 'quantity')),
+            {products[0].id: 2, products[1].id: 2, products[2].id: 2},
+        )
+        self.assertFalse(Cart.objects.filter(user__isnull=True).exists())
+        self.assertEqual(self.client.session['cart_count'], 6)
+
+    def test_quantity_changes_upsert_a_single_line(self):
+        product = make_catalog()[0]
+        self.client.get(f'/cart/add/{product.id}/')
+        self.client.get(f'/cart/add/{product.id}/')
+        self.client.post(f'/cart/update/{product.id}/', {'quantity': 5})
+
+        self.assertEqual(
+            list(CartItem.objects.filter(cart__user=self.buyer).values_list('quantity', flat=True)), [5],
+        )
+
+    def test_locked_database_asks_buyer_to_retry(self):
+        product = make_catalog()[0]
+        self.fill_cart([product])
+
+        with mock.patch('ecommerce.views.place_order', side_effect=OperationalError('database is locked')):
+            response = self.client.get('/checkout/')
+
+        self.assertRedirects(response, '/cart/', fetch_redirect_response=False)
+        self.assertEqual(
+            [str(m) for m in get_messages(response.wsgi_request)],
+            ['The store is busy right now. Please try placing your order again.'],
+        )
+        self.assertEqual(CartItem.objects.filter(cart__user=self.buyer).count(), 1)
+
+    def test_other_database_errors_are_not_reported_as_busy(self):
+        self.fill_cart(make_catalog())
+
+        with mock.patch('ecommerce.views.place_order', side_effect=OperationalError('no such table: ecommerce_order')):
+            with self.assertRaises(OperationalError):
+                self.client.get('/checkout/')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.product = make_catalog()[0]
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.client.force_login(self.buyer)
+
+    def assertAggregates(self, count, total, verified):
+        self.product.refresh_from_db()
+        self.assertEqual(
+            (self.product.rating_count, self.product.rating_sum, self.product.verified_count),
+            (count, total, verified),
+        )
+
+    def test_review_create_and_edit_update_aggregates(self):
+        url = f'/product/{self.product.id}/review/'
+        self.client.post(url, {'rating': 4, 'comment': 'Good'})
+        self.assertAggregates(1, 4, 0)
+
+        place_order(self.buyer, {str(self.product.id): 1})
+        self.client.post(url, {'rating': 2, 'comment': 'Worse than I thought'})
+        self.assertAggregates(1, 2, 1)
+        self.assertEqual(self.product.average_rating, 2.0)
+
+    def test_rebuild_command_recomputes_aggregates(self):
+        Review.objects.create(product=self.product, user=self.buyer, rating=5, comment='Great', is_verified=True)
+        Product.objects.update(rating_count=7, rating_sum=1)
+
+        call_command('rebuild_ratings', stdout=StringIO())
+
+        self.assertAggregates(1, 5, 1)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, REVIEWS_PAGE_SIZE=5)
+class ProductDetailTests(TestCase):
+    def setUp(self):
+        self.product = make_catalog()[0]
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.client.force_login(self.buyer)
+
+    def add_reviews(self, count, start=0):
+        for i in range(start, start + count):
+            reviewer = User.objects.create_user(f'reviewer{i}', f'reviewer{i}@example.com', 'password')
+            Review.objects.create(product=self.product, user=reviewer, rating=5, comment='Nice')
+
+    def detail_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/product/{self.product.id}/')
+        return response, len(ctx)
+
+    def test_query_count_does_not_grow_with_reviews(self):
+        self.add_reviews(2)
+        _, few = self.detail_queries()
+        self.add_reviews(10, start=2)
+        response, many = self.detail_queries()
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.context['reviews']), 5)
+        self.assertTrue(response.context['reviews_page'].has_next)
+
+    def test_purchase_and_review_flags(self):
+        response, _ = self.detail_queries()
+        self.assertFalse(response.context['has_purchased'])
+        self.assertFalse(response.context['has_reviewed'])
+
+        place_order(self.buyer, {str(self.product.id): 1})
+        Review.objects.create(product=self.product, user=self.buyer, rating=4, comment='Good')
+        response, _ = self.detail_queries()
+        self.assertTrue(response.context['has_purchased'])
+        self.assertTrue(response.context['has_reviewed'])
+
+    async def test_async_views_under_asgi(self):
+        await self.async_client.aforce_login(self.buyer)
+        for path in ['/', f'/product/{self.product.id}/', '/cart/', '/orders/']:
+            response = await self.async_client.get(path)
+            self.assertEqual(response.status_code, 200, path)
+        self.assertEqual((await self.async_client.get('/product/0/')).status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class SearchTests(TestCase):
+    def setUp(self):
+        vendor = User.objects.create_user('vendor', 'vendor@example.com', 'password', role=User.VENDOR)
+        self.store = Store.objects.create(name='Audio', vendor=vendor)
+        self.other_store = Store.objects.create(name='Other', vendor=vendor)
+        self.headphones = Product.objects.create(
+            name='Wireless Headphones', description='Over-ear, noise cancelling',
+            price='99.00', stock_quantity=3, store=self.store,
+        )
+        self.cable = Product.objects.create(
+            name='Audio Cable', description='Fits most headphones',
+            price='9.00', stock_quantity=3, store=self.other_store,
+        )
+
+    def names(self, query, **filters):
+        return [product.name for product in search_products(query, **filters)]
+
+    def test_prefix_match_ranks_name_hits_first(self):
+        self.assertEqual(self.names('headph'), ['Wireless Headphones', 'Audio Cable'])
+        self.assertEqual(self.names('wireless noise'), ['Wireless Headphones'])
+        self.assertEqual(self.names('"; DROP TABLE'), [])
+
+    def test_filters(self):
+        self.assertEqual(self.names('headphones', store_id=self.other_store.id), ['Audio Cable'])
+        self.assertEqual(self.names('headphones', min_price=Decimal('50')), ['Wireless Headphones'])
+        self.assertEqual(self.names('headphones', max_price=Decimal('50')), ['Audio Cable'])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.headphones.name = 'Bluetooth Speaker'
+        self.headphones.description = 'Loud'
+        self.headphones.save()
+        self.assertEqual(self.names('speaker'), ['Bluetooth Speaker'])
+        self.assertEqual(self.names('wireless'), [])
+
+        self.cable.delete()
+        self.assertEqual(self.names('cable'), [])
+
+    def test_fallback_without_fts(self):
+        with mock.patch('ecommerce.search.fts_available', return_value=False):
+            self.assertEqual(self.names('headph'), ['Wireless Headphones', 'Audio Cable'])
+            self.assertEqual(self.names('headphones', store_id=self.store.id), ['Wireless Headphones'])
+
+    def test_search_view(self):
+        response = self.client.get('/search/', {'q': 'cable', 'max_price': 'abc'})
+        self.assertContains(response, 'Audio Cable')
+        self.assertNotContains(response, 'Wireless Headphones')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ProductCardCacheTests(TestCase):
+    def setUp(self):
+        caches[settings.PRODUCT_CARD_CACHE].clear()
+        self.products = make_catalog(products=3)
+
+    def test_cached_cards_render_identically(self):
+        cold = self.client.get('/').content
+        with mock.patch.object(ProductCardCache, 'set') as cache_set:
+            warm = self.client.get('/').content
+
+        cache_set.assert_not_called()
+        self.assertEqual(cold, warm)
+
+    def test_cards_vary_by_buyer(self):
+        self.client.get('/')
+        self.client.force_login(User.objects.create_user('buyer', 'buyer@example.com', 'password'))
+        self.assertContains(self.client.get('/'), 'Add to Cart', count=3)
+
+    def test_store_and_stock_changes_invalidate_cards(self):
+        self.client.get('/')
+        store = Store.objects.get()
+        store.name = 'Renamed Store'
+        store.save()
+        Product.objects.filter(pk=self.products[0].pk).update(stock_quantity=4)
+
+        response = self.client.get('/')
+        self.assertContains(response, 'Renamed Store', count=3)
+        self.assertContains(response, '<strong>Stock:</strong> 4', count=1)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS, QUERY_PROFILER_ENABLED=True)
+class QueryProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog(products=6)
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.client.force_login(self.buyer)
+
+    def test_reports_queries_in_headers_and_log(self):
+        with self.assertLogs('ecommerce.profiling', level='INFO') as logs:
+            response = self.client.get('/')
+
+        self.assertGreater(int(response['X-DB-Query-Count']), 0)
+        self.assertGreater(float(response['X-Render-Time-Ms']), 0)
+        self.assertEqual(response['X-DB-N-Plus-One'], '0')
+        report = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(report['path'], '/')
+        self.assertEqual(report['queries'], int(response['X-DB-Query-Count']))
+
+    @override_settings(ROOT_URLCONF='ecommerce.tests')
+    def test_flags_per_row_lookups(self):
+        place_order(self.buyer, {str(product.id): 1 for product in self.products})
+        with self.assertLogs('ecommerce.profiling', level='WARNING') as logs:
+            response = self.client.get('/product-names/')
+
+        self.assertEqual(response['X-DB-N-Plus-One'], '1')
+        report = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(report['n_plus_one'][0]['count'], 6)
+
+    @override_settings(QUERY_PROFILER_ENABLED=False)
+    def test_disabled_by_default(self):
+        self.assertNotIn('X-DB-Query-Count', self.client.get('/'))
+
+
+class DatabaseTuningTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_new_connections_get_sqlite_pragmas(self):
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), settings.SQLITE_PRAGMAS['busy_timeout'])
+
+    def test_transactions_take_the_write_lock_up_front(self):
+        self.assertEqual(connection.settings_dict['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class QueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN for the hot lookups: each must use its index, never scan or sort the table"""
+
+    def setUp(self):
+        self.product = make_catalog()[0]
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+
+    def assertUsesIndex(self, queryset, expected):
+        plan = queryset.explain()
+        self.assertIn(expected, plan)
+        for line in plan.splitlines():
+            self.assertNotRegex(line, r'SCAN \w+$', plan)
+            self.assertNotIn('TEMP B-TREE', line, plan)
+
+    def test_home_page_in_stock_products(self):
+        products = Product.objects.filter(stock_quantity__gt=0).select_related('store')
+        paginator = KeysetPaginator(products, 24)
+        for cursor in [{}, {'after': encode_cursor(self.product)}, {'before': encode_cursor(self.product)}]:
+            queryset, _, _ = paginator.plan(cursor.get('after'), cursor.get('before'))
+            self.assertUsesIndex(queryset[:25], 'INDEX product_in_stock_created_idx')
+
+    def test_product_reviews_page(self):
+        review = Review.objects.create(product=self.product, user=self.user, rating=5, comment='Great')
+        paginator = KeysetPaginator(Review.objects.filter(product=self.product).select_related('user'), 10)
+        for cursor in [{}, {'after': encode_cursor(review)}, {'before': encode_cursor(review)}]:
+            queryset, _, _ = paginator.plan(cursor.get('after'), cursor.get('before'))
+            self.assertUsesIndex(queryset[:11], 'INDEX review_product_created_idx')
+
+    def test_purchase_check(self):
+        purchased = PurchasedProduct.objects.filter(buyer=self.user, product=self.product)
+        # SQLite names the unique constraint's index itself
+        self.assertUsesIndex(purchased, 'COVERING INDEX sqlite_autoindex_ecommerce_purchasedproduct_1')
+
+    def test_unused_reset_tokens(self):
+        tokens = PasswordResetToken.objects.filter(user=self.user, used=False)
+        self.assertUsesIndex(tokens, 'INDEX reset_token_user_unused_idx')
+
+    def test_vendor_stores(self):
+        self.assertUsesIndex(Store.objects.filter(vendor=self.user), 'INDEX store_vendor_created_idx')
+
+    def test_buyer_order_history(self):
+        orders = buyer_orders(self.user).order_by('-created_at', '-pk')[:21]
+        self.assertUsesIndex(orders, 'INDEX order_buyer_created_idx')
+
+
+@override_settings(DATABASE_REPLICA_ALIAS='replica')
+class ReplicaRoutingTests(TestCase):
+    def test_reads_use_replica_only_when_opted_in_and_clean(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Product), 'default')
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Product), 'replica')
+            self.assertEqual(router.db_for_read(Session), 'default')
+            self.assertEqual(router.db_for_write(Product), 'default')
+            self.assertEqual(router.db_for_read(Product), 'default')
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        seen = []
+
+        def view(request):
+            seen.append(routing_state().pinned)
+            if request.method == 'POST':
+                Cart.objects.create()
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        response = middleware(RequestFactory().post('/'))
+        cookie = response.cookies[settings.REPLICA_STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_STICKY_SECONDS)
+
+        request = RequestFactory().get('/')
+        request.COOKIES[settings.REPLICA_STICKY_COOKIE] = cookie.value
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, middleware(request).cookies)
+        middleware(RequestFactory().get('/'))
+        self.assertEqual(seen, [False, True, False])
+
+    async def test_async_requests_are_tracked(self):
+        async def view(request):
+            await Cart.objects.acreate()
+            return HttpResponse()
+
+        response = await ReplicaRoutingMiddleware(view)(AsyncRequestFactory().post('/'))
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ImageRenditionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        caches[settings.PRODUCT_CARD_CACHE].clear()
+        self.product = make_catalog()[0]
+        self.client.force_login(self.product.store.vendor)
+
+    def upload(self, width, height, name='photo.jpg'):
+        buffer = BytesIO()
+        Image.new('RGB', (width, height), 'red').save(buffer, 'JPEG')
+        response = self.post_image(SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg'))
+        self.product.refresh_from_db()
+        return response
+
+    def post_image(self, image):
+        return self.client.post(f'/vendor/products/{self.product.id}/edit/', {
+            'name': self.product.name, 'description': self.product.description,
+            'price': self.product.price, 'stock_quantity': self.product.stock_quantity,
+            'store': self.product.store_id, 'image': image,
+        })
+
+    def test_upload_is_processed_off_request_path(self):
+        self.upload(600, 300)
+        self.assertTrue(self.product.renditions_pending)
+        self.assertEqual(self.product.image_renditions, {})
+        self.assertEqual(self.product.get_rendition_url(400), self.product.image.url)
+
+        self.assertEqual(process_pending(), (1, 0))
+
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.renditions_pending)
+        self.assertEqual(sorted(self.product.image_renditions, key=int), ['200', '400', '600'])
+        self.assertTrue(self.product.get_rendition_url(300).endswith('-400w.webp'))
+        self.assertTrue(self.product.get_rendition_url(1000).endswith('-600w.webp'))
+        self.assertContains(self.client.get('/'), '-400w.webp')
+
+    def test_replacing_image_removes_old_renditions(self):
+        self.upload(300, 300)
+        process_pending()
+        self.product.refresh_from_db()
+        old_files = list(self.product.image_renditions.values())
+
+        self.upload(250, 100)
+        # Until the worker runs, pages show the new original, not the old renditions
+        self.assertEqual(self.product.get_rendition_url(400), self.product.image.url)
+        response = self.client.get(f'/product/{self.product.id}/')
+        self.assertContains(response, self.product.image.url)
+        for name in old_files:
+            self.assertNotContains(response, os.path.basename(name))
+        process_pending()
+
+        self.product.refresh_from_db()
+        self.assertEqual(sorted(self.product.image_renditions, key=int), ['200', '250'])
+        for name in old_files:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_upload_during_processing_stays_pending(self):
+        self.upload(300, 300, name='first.jpg')
+        stale = Product.objects.get(pk=self.product.pk)
+        self.upload(250, 100, name='second.jpg')
+
+        process_product(stale)
+
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.renditions_pending)
+        self.assertEqual(self.product.image_renditions, {})
+        _, files = default_storage.listdir(f'products/renditions/{self.product.pk}')
+        self.assertEqual(files, [])
+
+        self.assertEqual(process_pending(), (1, 0))
+        self.product.refresh_from_db()
+        self.assertEqual(sorted(self.product.image_renditions, key=int), ['200', '250'])
+
+    def test_identical_uploads_share_one_file(self):
+        self.upload(300, 300, name='first.jpg')
+        first = self.product.image.name
+        other = Product.objects.create(
+            name='Other', description='Description', price='1.00', stock_quantity=1, store=self.product.store,
+        )
+        self.product = other
+        self.upload(300, 300, name='second.JPG')
+
+        self.assertEqual(other.image.name, first)
+        self.assertRegex(first, r'^products/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        _, files = default_storage.listdir(os.path.dirname(first))
+        self.assertEqual(files, [os.path.basename(first)])
+
+    def test_rejects_non_images_from_first_chunk(self):
+        fake = SimpleUploadedFile('photo.jpg', b'<?php echo 1; ?>' * 100, content_type='image/jpeg')
+        response = self.post_image(fake)
+
+        self.assertContains(response, 'File must be a JPEG, PNG, GIF or WebP image.')
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.image)
+
+    @override_settings(PRODUCT_IMAGE_MAX_UPLOAD_SIZE=1024 * 1024)
+    def test_rejects_oversized_upload_while_streaming(self):
+        handler = ImageUploadHandler(mock.Mock(spec=[]))
+        handler.new_file('image', 'big.png', 'image/png', None)
+        chunk = b'\x89PNG\r\n\x1a\n' + b'\0' * (handler.chunk_size - 8)
+        for i in range(16):
+            handler.receive_data_chunk(chunk, i * handler.chunk_size)
+        with self.assertRaises(SkipFile):
+            handler.receive_data_chunk(b'\0', 16 * handler.chunk_size)
+        self.assertEqual(handler.request.upload_errors, {'image': 'Image file too large (max 1MB).'})
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class PurchasedProductTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog(products=3)
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+
+    def purchases(self):
+        return list(PurchasedProduct.objects.order_by('product').values_list('buyer', 'product'))
+
+    def test_checkout_records_purchases_once(self):
+        first, second, _ = self.products
+        place_order(self.buyer, {str(first.id): 1, str(second.id): 1})
+        place_order(self.buyer, {str(first.id): 2})
+
+        expected = [(self.buyer.id, first.id), (self.buyer.id, second.id)]
+        self.assertEqual(self.purchases(), expected)
+
+        PurchasedProduct.objects.all().delete()
+        call_command('rebuild_purchases', stdout=StringIO())
+        self.assertEqual(self.purchases(), expected)
+
+    def test_reviews_are_verified_from_purchases(self):
+        bought, not_bought, _ = self.products
+        place_order(self.buyer, {str(bought.id): 1})
+        self.client.force_login(self.buyer)
+        for product in (bought, not_bought):
+            self.client.post(f'/product/{product.id}/review/', {'rating': 5, 'comment': 'Great'})
+
+        verified = dict(Review.objects.values_list('product', 'is_verified'))
+        self.assertEqual(verified, {bought.id: True, not_bought.id: False})
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog(products=2)
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+
+    def rollups(self):
+        return list(DailySales.objects.order_by('product').values_list('product', 'units', 'revenue', 'orders'))
+
+    def test_checkout_updates_rollups_incrementally(self):
+        first, second = self.products
+        place_order(self.buyer, {str(first.id): 2, str(second.id): 1})
+        place_order(self.buyer, {str(first.id): 3})
+
+        expected = [(first.id, 5, Decimal('49.95'), 2), (second.id, 1, Decimal('9.99'), 1)]
+        self.assertEqual(self.rollups(), expected)
+
+        DailySales.objects.all().delete()
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups(), expected)
+
+    def test_dashboard_reads_only_rollups(self):
+        place_order(self.buyer, {str(self.products[0].id): 2})
+        self.client.force_login(self.products[0].store.vendor)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/vendor/dashboard/')
+
+        sales = response.context['sales']
+        self.assertEqual((sales['revenue'], sales['units']), (Decimal('19.98'), 2))
+        self.assertEqual(sales['daily'][-1]['percent'], 100)
+        self.assertContains(response, 'Product 0')
+        self.assertFalse([q for q in ctx.captured_queries if 'ecommerce_orderitem' in q['sql']])
+
+    def test_dashboard_keeps_same_named_products_apart(self):
+        first = self.products[0]
+        other = Store.objects.create(name='Outlet', vendor=first.store.vendor)
+        twin = Product.objects.create(
+            name=first.name, description='Description', price='5.00', stock_quantity=10, store=other,
+        )
+        place_order(self.buyer, {str(first.id): 2, str(twin.id): 1})
+
+        products = vendor_sales(first.store.vendor)['products']
+
+        self.assertEqual(
+            [(row['product'], row['name'], row['store_name'], row['units']) for row in products],
+            [(first.id, 'Product 0', 'Store', 2), (twin.id, 'Product 0', 'Outlet', 1)],
+        )
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class CatalogSeederTests(TestCase):
+    COUNTS = {'vendors': 2, 'stores': 3, 'products': 30, 'buyers': 6, 'orders': 25}
+
+    def seed(self):
+        out = StringIO()
+        call_command('seed_catalog', scale='tiny', seed=3, batch_size=7, stdout=out, **self.COUNTS)
+        return out.getvalue()
+
+    def snapshot(self):
+        """The seeded data keyed by natural values, since ids change between runs"""
+        return {
+            'products': list(Product.objects.order_by('name').values_list(
+                'name', 'description', 'price', 'stock_quantity', 'store__name', 'store__vendor__username',
+            )),
+            'reviews': sorted(Review.objects.values_list('product__name', 'user__username', 'rating', 'comment')),
+            'orders': sorted(
+                (order.buyer.username, order.total_amount, tuple(sorted(
+                    (item.product.name, item.quantity, item.price) for item in order.items.all()
+                )))
+                for order in Order.objects.select_related('buyer').prefetch_related('items__product')
+            ),
+        }
+
+    def test_command_writes_requested_counts(self):
+        out = self.seed()
+
+        self.assertEqual(User.objects.filter(role=User.VENDOR).count(), 2)
+        self.assertEqual(User.objects.filter(role=User.BUYER).count(), 6)
+        self.assertEqual((Store.objects.count(), Product.objects.count(), Order.objects.count()), (3, 30, 25))
+        self.assertLessEqual(Review.objects.count(), 30 * SCALES['tiny']['reviews_per_product'])
+        self.assertIn(f'{OrderItem.objects.count()} order_items', out)
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_same_seed_generates_same_data(self):
+        self.seed()
+        first = self.snapshot()
+        User.objects.all().delete()
+
+        self.seed()
+
+        self.assertEqual(self.snapshot(), first)
+
+    def test_rollups_ratings_and_search_match_the_data(self):
+        self.seed()
+
+        reviews = {
+            row['product']: row
+            for row in Review.objects.values('product').annotate(
+                count=Count('pk'), total=Sum('rating'), verified=Count('pk', filter=Q(is_verified=True)),
+            )
+        }
+        for product in Product.objects.all():
+            row = reviews.get(product.pk, {'count': 0, 'total': 0, 'verified': 0})
+            self.assertEqual(
+                (product.rating_count, product.rating_sum, product.verified_count),
+                (row['count'], row['total'] or 0, row['verified']),
+            )
+
+        sold = OrderItem.objects.aggregate(units=Sum('quantity'), revenue=Sum(F('price') * F('quantity')))
+        rollups = DailySales.objects.aggregate(units=Sum('units'), revenue=Sum('revenue'))
+        self.assertEqual(rollups['units'], sold['units'])
+        self.assertEqual(rollups['revenue'], Decimal(sold['revenue']).quantize(Decimal('0.01')))
+
+        bought = set(OrderItem.objects.values_list('order__buyer', 'product').distinct())
+        self.assertEqual(set(PurchasedProduct.objects.values_list('buyer', 'product')), bought)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT rowid FROM {FTS_TABLE}')
+            indexed = {row[0] for row in cursor.fetchall()}
+        self.assertEqual(indexed, set(Product.objects.values_list('pk', flat=True)))
+        product = Product.objects.order_by('pk').last()
+        self.assertIn(product, search_products(product.name))
+
+
+class BenchmarkGateTests(TestCase):
+    def result(self, p90, queries):
+        return {'p50_ms': p90 / 2, 'p90_ms': p90, 'p99_ms': p90 * 2, 'queries': queries}
+
+    def test_percentile_uses_nearest_rank(self):
+        values = [5, 1, 4, 2, 3, 10, 9, 8, 7, 6]
+        self.assertEqual(
+            [percentile(values, pct) for pct in (0, 10, 50, 55, 90, 99, 100)],
+            [1, 1, 5, 6, 9, 10, 10],
+        )
+        self.assertEqual(percentile([7.5], 99), 7.5)
+
+    def test_compare_applies_tolerance_and_query_counts(self):
+        baseline = {'home': self.result(10.0, 3), 'cart': self.result(20.0, 5)}
+        results = {
+            'home': self.result(11.0, 3),  # exactly at the 10% tolerance
+            'cart': self.result(22.5, 6),
+        }
+
+        self.assertEqual(compare(results, baseline, 0.10), [
+            'cart: p90 22.5ms vs baseline 20.0ms',
+            'cart: 6 queries vs baseline 5',
+        ])
+        self.assertEqual(compare(results, baseline, 0.20), ['cart: 6 queries vs baseline 5'])
+
+    def test_endpoints_missing_from_the_baseline_are_skipped(self):
+        results = {'home': self.result(50.0, 9), 'checkout': self.result(80.0, 12)}
+
+        self.assertEqual(compare(results, {}, 0.10), [])
+        self.assertEqual(compare(results, {'home': self.result(50.0, 9)}, 0.10), [])
+
+    def test_missing_baseline_file_skips_the_gate(self):
+        path = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        results = {'home': self.result(10.0, 3)}
+
+        self.assertIsNone(check_baseline(results, path, 0.10))
+        save_baseline(path, results)
+
+        self.assertEqual(load_baseline(path), results)
+        self.assertEqual(check_baseline(results, path, 0.0), [])
+        self.assertEqual(check_baseline({'home': self.result(10.0, 4)}, path, 0.0), ['home: 4 queries vs baseline 3'])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ProductImportTests(TestCase):
+    CSV = (
+        'sku,name,description,price,stock_quantity\n'
+        'A-1,Desk Lamp,Bright lamp,19.99,5\n'
+        'A-2,Bad Price,Oops,-1,5\n'
+        'A-3,Yoga Mat,Non-slip mat,25.00,3\n'
+    )
+
+    def setUp(self):
+        vendor = User.objects.create_user('vendor', 'vendor@example.com', 'password', role=User.VENDOR)
+        self.store = Store.objects.create(name='Store', vendor=vendor)
+
+    def import_file(self, name, content):
+        path = os.path.join(tempfile.mkdtemp(), name)
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+        out, err = StringIO(), StringIO()
+        call_command('import_products', path, store=self.store.id, batch_size=2, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_creates_then_updates_by_sku_and_reports_bad_rows(self):
+        out, err = self.import_file('products.csv', self.CSV)
+        self.assertIn('2 created, 0 updated, 1 rejected', out)
+        self.assertIn('Row 2: price: Price cannot be negative.', err)
+
+        out, _ = self.import_file('products.jsonl', '\n'.join([
+            '{"sku": "A-1", "name": "Desk Lamp XL", "description": "Brighter", "price": "24.50", "stock_quantity": 9}',
+            '{"sku": "B-1", "name": "Teapot", "description": "Ceramic", "price": 12, "stock_quantity": 1}',
+        ]))
+        self.assertIn('1 created, 1 updated, 0 rejected', out)
+
+        lamp = Product.objects.get(store=self.store, sku='A-1')
+        self.assertEqual((lamp.name, lamp.price, lamp.stock_quantity), ('Desk Lamp XL', Decimal('24.50'), 9))
+        self.assertEqual(Product.objects.filter(store=self.store).count(), 3)
+        self.assertEqual([p.sku for p in search_products('brighter')], ['A-1'])
+
+    def test_reads_json_arrays_across_chunk_boundaries(self):
+        rows = [{'sku': f'S-{i}', 'name': f'Item {i}', 'price': '1.00'} for i in range(50)]
+        stream = BytesIO(json.dumps(rows, indent=2).encode())
+        self.assertEqual(list(read_json(stream, chunk_size=7)), rows)
+
+    def test_vendor_import_endpoint(self):
+        self.client.force_login(self.store.vendor)
+        upload = SimpleUploadedFile('products.csv', self.CSV.encode(), content_type='text/csv')
+
+        response = self.client.post(f'/vendor/stores/{self.store.id}/import/', {'file': upload})
+
+        self.assertContains(response, 'Imported 2 products (2 new, 0 updated, 1 rejected).')
+        self.assertContains(response, 'Price cannot be negative.')
+        self.assertEqual(sorted(self.store.products.values_list('sku', flat=True)), ['A-1', 'A-3'])
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class OrderViewTests(TestCase):
+    def setUp(self):
+        caches[settings.ORDER_SUMMARY_CACHE].clear()
+        self.products = make_catalog(products=6)
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.client.force_login(self.buyer)
+
+    def test_detail_queries_do_not_grow_with_lines(self):
+        small, _ = place_order(self.buyer, {str(self.products[0].id): 2})
+        large, _ = place_order(self.buyer, {str(product.id): 3 for product in self.products})
+
+        with CaptureQueriesContext(connection) as small_ctx:
+            self.client.get(f'/order/{small.id}/')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/order/{large.id}/')
+
+        self.assertEqual(len(ctx), len(small_ctx))
+        self.assertContains(response, '<td>$29.97</td>', count=6)
+        self.assertContains(response, 'Product 5')
+
+    def test_history_lists_only_own_orders(self):
+        order, _ = place_order(self.buyer, {str(self.products[0].id): 1})
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        other_order, _ = place_order(other, {str(self.products[1].id): 1})
+
+        response = self.client.get('/orders/')
+        self.assertContains(response, f'#{order.id}</a>')
+        self.assertNotContains(response, f'#{other_order.id}</a>')
+        self.assertEqual(self.client.get(f'/order/{other_order.id}/').status_code, 404)
+
+    def test_history_pages_with_annotated_counts(self):
+        orders = [
+            place_order(self.buyer, {str(product.id): 2 for product in self.products[:n]})[0]
+            for n in (1, 2, 3)
+        ]
+        first = self.client.get('/orders/?page_size=2')
+        self.assertEqual([order.id for order in first.context['orders']], [orders[2].id, orders[1].id])
+        self.assertEqual(
+            [(order.line_count, order.item_count) for order in first.context['orders']], [(3, 6), (2, 4)],
+        )
+
+        second = self.client.get(f'/orders/?page_size=2&after={first.context["page"].next_cursor}')
+        self.assertEqual([order.id for order in second.context['orders']], [orders[0].id])
+        self.assertFalse(second.context['page'].has_next)
+
+    def test_summary_is_cached_until_checkout(self):
+        place_order(self.buyer, {str(self.products[0].id): 2})
+        self.client.get('/orders/')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/orders/')
+        self.assertEqual(response.context['summary'], {'orders': 1, 'items': 2, 'spent': Decimal('19.98')})
+        self.assertFalse([q for q in ctx.captured_queries if 'COUNT("ecommerce_order"."id")' in q['sql']])
+
+        place_order(self.buyer, {str(self.products[1].id): 1})
+        response = self.client.get('/orders/')
+        self.assertEqual(response.context['summary'], {'orders': 2, 'items': 3, 'spent': Decimal('29.97')})
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog(products=2)
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        other = User.objects.create_user('other', 'other@example.com', 'password')
+        self.order, _ = place_order(self.buyer, {str(self.products[0].id): 2, str(self.products[1].id): 1})
+        place_order(other, {str(self.products[0].id): 1})
+
+    def test_buyer_csv_streams_only_their_lines(self):
+        self.client.force_login(self.buyer)
+        response = self.client.get('/orders/export.csv')
+
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['order_id', 'ordered_at', 'buyer'])
+        self.assertEqual(
+            sorted((row[0], row[5], row[6], row[8]) for row in rows[1:]),
+            [(str(self.order.id), 'Product 0', '2', '19.98'), (str(self.order.id), 'Product 1', '1', '9.99')],
+        )
+
+    def test_vendor_ndjson_fetches_in_chunks(self):
+        self.client.force_login(self.products[0].store.vendor)
+        with override_settings(ORDER_EXPORT_CHUNK_SIZE=2), CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/orders/export.ndjson')
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+        lines.sort(key=lambda line: (line['order_id'], line['product']))
+        self.assertEqual([line['product'] for line in lines], ['Product 0', 'Product 1', 'Product 0'])
+        self.assertEqual(lines[0]['line_total'], '19.98')
+        # Vendors are not shown who bought
+        self.assertEqual(list(lines[0]), VENDOR_EXPORT_COLUMNS)
+        self.assertNotIn('buyer', lines[0])
+        self.assertEqual(len([q for q in ctx.captured_queries if 'ecommerce_orderitem' in q['sql']]), 1)
+        self.assertEqual(self.client.get('/orders/export.xml').status_code, 404)
+
+    async def test_asgi_export_streams_from_an_async_iterator(self):
+        await self.async_client.aforce_login(self.buyer)
+        with override_settings(ORDER_EXPORT_CHUNK_SIZE=1):
+            response = await self.async_client.get('/orders/export.csv')
+            self.assertTrue(response.is_async)
+            content = b''.join([chunk async for chunk in response.streaming_content])
+
+        rows = list(csv.reader(content.decode().splitlines()))
+        self.assertEqual(rows[0], EXPORT_COLUMNS)
+        self.assertEqual(sorted(row[5] for row in rows[1:]), ['Product 0', 'Product 1'])
+
+    def test_lines_are_not_sorted_before_streaming(self):
+        for user in [self.buyer, self.products[0].store.vendor]:
+            _, lines = order_lines(user)
+            self.assertNotIn('TEMP B-TREE', lines.explain())
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.product = make_catalog()[0]
+        self.buyer = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+
+    def test_checkout_queues_invoice_until_worker_runs(self):
+        order, _ = place_order(self.buyer, {str(self.product.id): 1})
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(order.invoice_sent)
+
+        self.assertEqual(deliver_batch(), (1, 0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['buyer@example.com'])
+        order.refresh_from_db()
+        self.assertTrue(order.invoice_sent)
+        self.assertEqual(deliver_batch(), (0, 0, 0))
+
+    def test_failed_send_is_retried_with_backoff(self):
+        order, _ = place_order(self.buyer, {str(self.product.id): 1})
+
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP down')):
+            self.assertEqual(deliver_batch(max_attempts=2), (0, 1, 0))
+
+        email = OutboxEmail.objects.get(order=order)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.last_error, 'SMTP down')
+        self.assertGreater(email.next_attempt_at, email.created_at)
+        # Not due yet, so the next run leaves it alone.
+        self.assertEqual(deliver_batch(), (0, 0, 0))
+
+        OutboxEmail.objects.update(next_attempt_at=email.created_at)
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP down')):
+            self.assertEqual(deliver_batch(max_attempts=2), (0, 0, 1))
+        order.refresh_from_db()
+        self.assertFalse(order.invoice_sent)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Many buyers racing for the same product must never oversell it"""
+
+    threads = 20
+    stock = 7
+
+    def test_no_oversell_under_concurrency(self):
+        product = make_catalog(stock=self.stock)[0]
+        buyers = [
+            User.objects.create_user(f'buyer{i}', f'buyer{i}@example.com', 'password')
+            for i in range(self.threads)
+        ]
+        clients = []
+        for buyer in buyers:
+            set_cart(buyer, {str(product.id): 1})
+            client = Client()
+            client.force_login(buyer)
+            clients.append(client)
+        barrier = threading.Barrier(self.threads)
+        results = []
+
+        def buy(client):
+            try:
+                barrier.wait()
+                response = client.get('/checkout/')
+                if response.url.startswith('/order/'):
+                    results.append('ok')
+                else:
+                    results.append(' '.join(str(m) for m in get_messages(response.wsgi_request)))
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=buy, args=(client,)) for client in clients]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        product.refresh_from_db()
+        sold = OrderItem.objects.filter(product=product).count()
+        self.assertEqual(len(results), self.threads)
+        self.assertEqual(results.count('ok'), self.stock, results)
+        self.assertEqual(
+            results.count('Product 0 is out of stock.'), self.threads - self.stock, results,
+        )
+        self.assertEqual(sold, self.stock)
+        self.assertEqual(product.stock_quantity, 0)
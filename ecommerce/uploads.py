@@ -0,0 +1,112 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+
+# Leading bytes of the image formats we accept; WebP is checked separately
+# because its signature has a length field in the middle.
+IMAGE_SIGNATURES = (
+    b'\xff\xd8\xff',  # JPEG
+    b'\x89PNG\r\n\x1a\n',  # PNG
+    b'GIF87a',
+    b'GIF89a',
+)
+SNIFF_BYTES = 12
+
+
+def is_image_header(header):
+    if header.startswith(IMAGE_SIGNATURES):
+        return True
+    return header[:4] == b'RIFF' and header[8:12] == b'WEBP'
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream uploads to a temporary file chunk by chunk, rejecting a file as soon
+    as it exceeds PRODUCT_IMAGE_MAX_UPLOAD_SIZE or its first bytes are not a
+    JPEG, PNG, GIF or WebP signature. The rest of a rejected file is read and
+    discarded without being stored, and the reason is recorded in
+    request.upload_errors[field_name]. Accepted files get a `sha256` attribute
+    computed while streaming. Only fields named in IMAGE_FIELDS are checked;
+    other uploads (such as product import files) are streamed to disk as is.
+    """
+    IMAGE_FIELDS = {'image'}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.is_image = self.field_name in self.IMAGE_FIELDS
+        self.received = 0
+        self.header = b''
+        self.hasher = hashlib.sha256()
+
+    def reject(self, message):
+        if not hasattr(self.request, 'upload_errors'):
+            self.request.upload_errors = {}
+        self.request.upload_errors[self.field_name] = message
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.is_image:
+            return super().receive_data_chunk(raw_data, start)
+        self.received += len(raw_data)
+        if self.received > settings.PRODUCT_IMAGE_MAX_UPLOAD_SIZE:
+            limit = settings.PRODUCT_IMAGE_MAX_UPLOAD_SIZE // (1024 * 1024)
+            self.reject(f'Image file too large (max {limit}MB).')
+            raise SkipFile
+        if len(self.header) < SNIFF_BYTES:
+            self.header += raw_data[:SNIFF_BYTES - len(self.header)]
+            if len(self.header) == SNIFF_BYTES and not is_image_header(self.header):
+                self.reject('File must be a JPEG, PNG, GIF or WebP image.')
+                raise SkipFile
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if not self.is_image:
+            return super().file_complete(file_size)
+        if not is_image_header(self.header):
+            # Files shorter than SNIFF_BYTES never reached the check above.
+            self.reject('File must be a JPEG, PNG, GIF or WebP image.')
+            self.file.close()
+            return None
+        uploaded = super().file_complete(file_size)
+        uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
+
+
+def upload_errors(request):
+    """Errors recorded by ImageUploadHandler for this request, keyed by field name"""
+    request.FILES  # Parse the body so the upload handlers have run
+    return getattr(request, 'upload_errors', {})
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Store each file under its SHA-256 digest, so identical uploads share one
+    file on disk instead of being saved again with a random suffix.
+    """
+
+    def save(self, name, content, max_length=None):
+        digest = getattr(content, 'sha256', None) or self.digest(content)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest[:2], f'{digest}{extension}')
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    @staticmethod
+    def digest(content):
+        hasher = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        return hasher.hexdigest()
+
+
+def product_image_storage():
+    return ContentAddressedStorage()
@@ -15,6 +15,7 @@ urlpatterns = [
     
     # Product pages
     path('product/<int:product_id>/', views.product_detail, name='product_detail'),
+    path('search/', views.search, name='search'),
     
     # Vendor pages
     path('vendor/dashboard/', views.vendor_dashboard, name='vendor_dashboard'),
@@ -22,6 +23,7 @@ urlpatterns = [
     path('vendor/stores/create/', views.store_create, name='store_create'),
     path('vendor/stores/<int:store_id>/edit/', views.store_edit, name='store_edit'),
     path('vendor/stores/<int:store_id>/delete/', views.store_delete, name='store_delete'),
+    path('vendor/stores/<int:store_id>/import/', views.product_import, name='product_import'),
     path('vendor/products/', views.product_list, name='product_list'),
     path('vendor/products/create/', views.product_create, name='product_create'),
     path('vendor/products/<int:product_id>/edit/', views.product_edit, name='product_edit'),
@@ -33,7 +35,9 @@ urlpatterns = [
     path('cart/update/<int:product_id>/', views.update_cart, name='update_cart'),
     path('cart/remove/<int:product_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('checkout/', views.checkout, name='checkout'),
+    path('orders/', views.order_history, name='order_history'),
     path('order/<int:order_id>/', views.order_detail, name='order_detail'),
+    path('orders/export.<str:fmt>', views.order_export, name='order_export'),
     path('product/<int:product_id>/review/', views.add_review, name='add_review'),
 ]
 
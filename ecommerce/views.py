@@ -1,35 +1,74 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
+from django.http import Http404, StreamingHttpResponse
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
+from django.db import OperationalError, transaction
+from django.db.models import DecimalField, Exists, ExpressionWrapper, F, OuterRef
+from django.core.handlers.asgi import ASGIRequest
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
-from .models import User, Store, Product, Order, OrderItem, Review, PasswordResetToken
+from .models import User, Store, Product, Order, OrderItem, PurchasedProduct, Review, PasswordResetToken
+from .pagination import KeysetPaginator, get_page_size
+from .cart import SessionCart, can_shop
+from .checkout import CheckoutError, is_lock_error, place_order
+from .exports import EXPORT_FORMATS, astream_export, stream_export
+from .fragments import ProductCardCache
+from .imports import ImportFormatError, ProductImporter, read_rows
+from .orders import aorder_summary, buyer_orders
+from .purchases import has_purchased
+from .ratings import apply_review_change
+from .routers import read_from_replica
+from .sales import vendor_sales
+from .search import search_products
+from .uploads import upload_errors
 from .forms import (
     VendorRegistrationForm, BuyerRegistrationForm, 
-    StoreForm, ProductForm, ReviewForm, PasswordResetForm, PasswordResetConfirmForm
+    StoreForm, ProductForm, ProductImportForm, ReviewForm, PasswordResetForm, PasswordResetConfirmForm
 )
 
 
-def home(request):
-    """Home page showing all products"""
+async def request_user(request):
+    """
+    Load the user without blocking the event loop, and keep it as
+    request.user for the sync context processors and templates.
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+async def arender(request, template_name, context=None):
+    """render() for async views: templates and context processors are sync-only"""
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@read_from_replica
+async def home(request):
+    """Home page showing in-stock products, one keyset page at a time"""
+    page_size = get_page_size(request, settings.CATALOG_PAGE_SIZE, settings.CATALOG_MAX_PAGE_SIZE)
     products = Product.objects.filter(stock_quantity__gt=0).select_related('store')
-    stores = Store.objects.all()
-    
-    # Get cart count for authenticated buyers
-    cart_count = 0
-    if request.user.is_authenticated and request.user.is_buyer():
-        cart = request.session.get('cart', {})
-        cart_count = sum(cart.values())
+    user = await request_user(request)
+    page = await KeysetPaginator(products, page_size).apage(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
     
+    # cart_count comes from the cart_count context processor
     context = {
-        'products': products,
-        'stores': stores,
-        'cart_count': cart_count,
+        'products': page.object_list,
+        'card_cache': ProductCardCache(page.object_list, user),
+        'page': page,
+        'page_size': page_size,
     }
-    return render(request, 'ecommerce/home.html', context)
+    return await arender(request, 'ecommerce/home.html', context)
 
 
 def register_vendor(request):
@@ -97,6 +136,7 @@ def logout_view(request):
 
 
 @login_required
+@read_from_replica
 def vendor_dashboard(request):
     """Vendor dashboard"""
     if not request.user.is_vendor():
@@ -109,6 +149,8 @@ def vendor_dashboard(request):
     context = {
         'stores': stores,
         'total_products': total_products,
+        # Sales figures come from the DailySales rollups, never from OrderItem
+        'sales': vendor_sales(request.user, settings.VENDOR_DASHBOARD_DAYS),
     }
     return render(request, 'ecommerce/vendor_dashboard.html', context)
 
@@ -206,7 +248,7 @@ def product_create(request):
         return redirect('store_create')
     
     if request.method == 'POST':
-        form = ProductForm(request.POST, request.FILES)
+        form = ProductForm(request.POST, request.FILES, upload_errors=upload_errors(request))
         form.fields['store'].queryset = stores
         if form.is_valid():
             product = form.save()
@@ -229,7 +271,7 @@ def product_edit(request, product_id):
     product = get_object_or_404(Product, id=product_id, store__vendor=request.user)
     
     if request.method == 'POST':
-        form = ProductForm(request.POST, request.FILES, instance=product)
+        form = ProductForm(request.POST, request.FILES, instance=product, upload_errors=upload_errors(request))
         form.fields['store'].queryset = Store.objects.filter(vendor=request.user)
         if form.is_valid():
             form.save()
@@ -242,6 +284,37 @@ def product_edit(request, product_id):
     return render(request, 'ecommerce/product_form.html', {'form': form, 'title': 'Edit Product', 'product': product})
 
 
+@login_required
+def product_import(request, store_id):
+    """Create or update a store's products from a CSV or JSON file, matched by SKU"""
+    if not request.user.is_vendor():
+        messages.error(request, 'Access denied.')
+        return redirect('home')
+    
+    store = get_object_or_404(Store, id=store_id, vendor=request.user)
+    importer = None
+    
+    if request.method == 'POST':
+        form = ProductImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            importer = ProductImporter(store)
+            try:
+                importer.run(read_rows(upload.file, upload.name))
+            except ImportFormatError as e:
+                messages.error(request, f'{e}. Rows before the error were imported.')
+            else:
+                messages.success(
+                    request,
+                    f'Imported {importer.created + importer.updated} products '
+                    f'({importer.created} new, {importer.updated} updated, {importer.error_count} rejected).'
+                )
+    else:
+        form = ProductImportForm()
+    
+    return render(request, 'ecommerce/product_import.html', {'form': form, 'store': store, 'importer': importer})
+
+
 @login_required
 def product_delete(request, product_id):
     """Delete a product"""
@@ -259,40 +332,88 @@ def product_delete(request, product_id):
     return render(request, 'ecommerce/product_confirm_delete.html', {'product': product})
 
 
-def product_detail(request, product_id):
-    """Product detail page with reviews"""
-    product = get_object_or_404(Product, id=product_id)
-    reviews = Review.objects.filter(product=product)
-    
-    # Check if user has purchased this product
-    has_purchased = False
-    if request.user.is_authenticated:
-        has_purchased = OrderItem.objects.filter(
-            order__buyer=request.user,
-            product=product
-        ).exists()
-    
-    # Check if user has already reviewed
-    user_review = None
-    if request.user.is_authenticated:
-        try:
-            user_review = Review.objects.get(product=product, user=request.user)
-        except Review.DoesNotExist:
-            pass
+@read_from_replica
+async def product_detail(request, product_id):
+    """Product detail page with a page of reviews"""
+    user = await request_user(request)
+    products = Product.objects.select_related('store')
+    if user.is_authenticated:
+        # Fold the purchase and existing-review checks into the product query;
+        # each is a probe of a (user, product) unique index
+        products = products.annotate(
+            has_purchased=Exists(PurchasedProduct.objects.filter(
+                buyer=user,
+                product=OuterRef('pk'),
+            )),
+            has_reviewed=Exists(Review.objects.filter(
+                user=user,
+                product=OuterRef('pk'),
+            )),
+        )
+    
+    product = await aget_object_or_404(products, id=product_id)
+    reviews = Review.objects.filter(product=product).select_related('user')
+    page = await KeysetPaginator(reviews, settings.REVIEWS_PAGE_SIZE).apage(
+        after=request.GET.get('reviews_after'),
+        before=request.GET.get('reviews_before'),
+    )
     
     context = {
         'product': product,
-        'reviews': reviews,
-        'has_purchased': has_purchased,
-        'user_review': user_review,
+        'reviews': page.object_list,
+        'reviews_page': page,
+        'has_purchased': getattr(product, 'has_purchased', False),
+        'has_reviewed': getattr(product, 'has_reviewed', False),
     }
-    return render(request, 'ecommerce/product_detail.html', context)
+    return await arender(request, 'ecommerce/product_detail.html', context)
+
+
+def search(request):
+    """Product search with optional store and price filters"""
+    query = request.GET.get('q', '').strip()
+    store_id = parse_int(request.GET.get('store'))
+    min_price = parse_decimal(request.GET.get('min_price'))
+    max_price = parse_decimal(request.GET.get('max_price'))
+    
+    products = []
+    if query:
+        products = search_products(
+            query,
+            store_id=store_id,
+            min_price=min_price,
+            max_price=max_price,
+            limit=settings.SEARCH_RESULTS_LIMIT,
+        )
+    
+    context = {
+        'query': query,
+        'products': products,
+        'stores': Store.objects.only('id', 'name').order_by('name'),
+        'store_id': store_id,
+        'min_price': min_price,
+        'max_price': max_price,
+    }
+    return render(request, 'ecommerce/search.html', context)
+
+
+def parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_decimal(value):
+    try:
+        number = Decimal(value)
+    except (TypeError, InvalidOperation):
+        return None
+    return number if number.is_finite() else None
 
 
-@login_required
 def add_to_cart(request, product_id):
     """Add product to cart"""
-    if not request.user.is_buyer():
+    if not can_shop(request.user):
         messages.error(request, 'Only buyers can add items to cart.')
         return redirect('home')
     
@@ -302,106 +423,72 @@ def add_to_cart(request, product_id):
         messages.error(request, 'Product is out of stock.')
         return redirect('product_detail', product_id=product_id)
     
-    cart = request.session.get('cart', {})
-    product_id_str = str(product_id)
-    
-    current_quantity = cart.get(product_id_str, 0)
-    new_quantity = current_quantity + 1
+    cart = SessionCart(request)
+    new_quantity = cart.quantity(product_id) + 1
     
     if new_quantity > product.stock_quantity:
         messages.error(request, f'Only {product.stock_quantity} items available in stock.')
         return redirect('product_detail', product_id=product_id)
     
-    cart[product_id_str] = new_quantity
-    request.session['cart'] = cart
+    cart.set(product_id, new_quantity)
     messages.success(request, f'{product.name} added to cart!')
     
     return redirect('cart')
 
 
-@login_required
-def cart(request):
+async def cart(request):
     """View shopping cart"""
-    if not request.user.is_buyer():
+    user = await request_user(request)
+    if not can_shop(user):
         messages.error(request, 'Access denied.')
         return redirect('home')
     
-    cart = request.session.get('cart', {})
-    cart_items = []
-    total = 0
-    
-    for product_id, quantity in cart.items():
-        try:
-            product = Product.objects.get(id=int(product_id))
-            if product.is_in_stock():
-                item_total = product.price * quantity
-                total += item_total
-                cart_items.append({
-                    'product': product,
-                    'quantity': quantity,
-                    'total': item_total,
-                })
-            else:
-                # Remove out of stock items
-                del cart[product_id]
-        except Product.DoesNotExist:
-            # Remove non-existent products
-            del cart[product_id]
-    
-    request.session['cart'] = cart
-    request.session.modified = True
+    # The constructor may import a legacy session cart with sync writes
+    cart = await sync_to_async(SessionCart)(request, user)
+    cart_items, total = await cart.aresolve()
     
     context = {
         'cart_items': cart_items,
         'total': total,
     }
-    return render(request, 'ecommerce/cart.html', context)
+    return await arender(request, 'ecommerce/cart.html', context)
 
 
-@login_required
 def update_cart(request, product_id):
     """Update cart item quantity"""
-    if not request.user.is_buyer():
+    if not can_shop(request.user):
         messages.error(request, 'Access denied.')
         return redirect('home')
     
-    product = get_object_or_404(Product, id=product_id)
     quantity = int(request.POST.get('quantity', 0))
-    
-    cart = request.session.get('cart', {})
-    product_id_str = str(product_id)
+    cart = SessionCart(request)
     
     if quantity <= 0:
-        cart.pop(product_id_str, None)
+        cart.remove(product_id)
         messages.success(request, 'Item removed from cart.')
-    elif quantity > product.stock_quantity:
+        return redirect('cart')
+    
+    product = get_object_or_404(Product.objects.only('stock_quantity'), id=product_id)
+    if quantity > product.stock_quantity:
         messages.error(request, f'Only {product.stock_quantity} items available.')
     else:
-        cart[product_id_str] = quantity
+        cart.set(product_id, quantity)
         messages.success(request, 'Cart updated.')
     
-    request.session['cart'] = cart
-    request.session.modified = True
-    
     return redirect('cart')
 
 
-@login_required
 def remove_from_cart(request, product_id):
     """Remove item from cart"""
-    if not request.user.is_buyer():
+    if not can_shop(request.user):
         messages.error(request, 'Access denied.')
         return redirect('home')
     
-    cart = request.session.get('cart', {})
-    product_id_str = str(product_id)
+    cart = SessionCart(request)
     
-    if product_id_str in cart:
-        product = Product.objects.get(id=product_id)
-        del cart[product_id_str]
-        request.session['cart'] = cart
-        request.session.modified = True
-        messages.success(request, f'{product.name} removed from cart.')
+    if product_id in cart:
+        cart.remove(product_id)
+        messages.success(request, 'Item removed from cart.')
     
     return redirect('cart')
 
@@ -413,113 +500,87 @@ def checkout(request):
         messages.error(request, 'Access denied.')
         return redirect('home')
     
-    cart = request.session.get('cart', {})
+    cart = SessionCart(request)
     
     if not cart:
         messages.warning(request, 'Your cart is empty.')
         return redirect('cart')
     
-    # Validate cart and stock
-    cart_items = []
-    total = 0
-    errors = []
-    
-    for product_id, quantity in cart.items():
-        try:
-            product = Product.objects.get(id=int(product_id))
-            if not product.is_in_stock():
-                errors.append(f'{product.name} is out of stock.')
-                continue
-            if quantity > product.stock_quantity:
-                errors.append(f'Only {product.stock_quantity} {product.name} available.')
-                continue
-            
-            item_total = product.price * quantity
-            total += item_total
-            cart_items.append({
-                'product': product,
-                'quantity': quantity,
-                'total': item_total,
-            })
-        except Product.DoesNotExist:
-            errors.append(f'Product with ID {product_id} no longer exists.')
-    
-    if errors:
-        for error in errors:
+    try:
+        order, _ = place_order(request.user, cart.data)
+    except CheckoutError as e:
+        for error in e.errors:
             messages.error(request, error)
         return redirect('cart')
+    except OperationalError as e:
+        if not is_lock_error(e):
+            raise
+        # The database stayed locked by other checkouts past busy_timeout;
+        # nothing was written, so the buyer can simply try again.
+        messages.error(request, 'The store is busy right now. Please try placing your order again.')
+        return redirect('cart')
     
-    # Create order
-    order = Order.objects.create(
-        buyer=request.user,
-        total_amount=total
-    )
-    
-    # Create order items and update stock
-    invoice_items = []
-    for item in cart_items:
-        OrderItem.objects.create(
-            order=order,
-            product=item['product'],
-            quantity=item['quantity'],
-            price=item['product'].price
-        )
-        
-        # Update stock
-        item['product'].stock_quantity -= item['quantity']
-        item['product'].save()
-        
-        invoice_items.append(item)
-    
-    # Clear cart
-    request.session['cart'] = {}
-    request.session.modified = True
-    
-    # Send invoice email
-    try:
-        send_invoice_email(request.user, order, invoice_items)
-        order.invoice_sent = True
-        order.save()
-        messages.success(request, 'Order placed successfully! Invoice sent to your email.')
-    except Exception as e:
-        messages.warning(request, f'Order placed successfully, but email could not be sent: {str(e)}')
+    cart.clear()
     
+    messages.success(request, 'Order placed successfully! Your invoice will be emailed to you shortly.')
     return redirect('order_detail', order_id=order.id)
 
 
-def send_invoice_email(user, order, items):
-    """Send invoice email to user"""
-    subject = f'Invoice for Order #{order.id}'
-    
-    message = f"""
-    Thank you for your purchase!
-    
-    Order Number: #{order.id}
-    Date: {order.created_at.strftime('%Y-%m-%d %H:%M:%S')}
-    
-    Items:
-    """
-    
-    for item in items:
-        message += f"\n- {item['product'].name} x{item['quantity']} @ ${item['product'].price} = ${item['total']}"
-    
-    message += f"\n\nTotal: ${order.total_amount}"
-    message += "\n\nThank you for shopping with us!"
+@login_required
+async def order_history(request):
+    """List the buyer's orders, newest first"""
+    user = await request_user(request)
+    if not user.is_buyer():
+        messages.error(request, 'Access denied.')
+        return redirect('home')
     
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL if hasattr(settings, 'DEFAULT_FROM_EMAIL') else 'noreply@ecommerce.com',
-        [user.email],
-        fail_silently=False,
+    page_size = get_page_size(request, settings.ORDER_HISTORY_PAGE_SIZE, settings.ORDER_HISTORY_MAX_PAGE_SIZE)
+    page = await KeysetPaginator(buyer_orders(user), page_size).apage(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
     )
+    summary = await aorder_summary(user)
+    
+    context = {
+        'orders': page.object_list,
+        'page': page,
+        'page_size': page_size,
+        'summary': summary,
+    }
+    return await arender(request, 'ecommerce/order_history.html', context)
 
 
 @login_required
-def order_detail(request, order_id):
+async def order_detail(request, order_id):
     """View order details"""
-    order = get_object_or_404(Order, id=order_id, buyer=request.user)
-    return render(request, 'ecommerce/order_detail.html', {'order': order})
+    user = await request_user(request)
+    # The order and its lines (joined to their products, with each line total
+    # computed by the database) take two queries, whatever the size.
+    lines = OrderItem.objects.filter(order_id=order_id, order__buyer=user).select_related('product').annotate(
+        line_total=ExpressionWrapper(
+            F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    ).order_by('pk')
+    order = await aget_object_or_404(Order, id=order_id, buyer=user)
+    items = await alist(lines)
+    return await arender(request, 'ecommerce/order_detail.html', {'order': order, 'items': items})
+
+
+@login_required
+def order_export(request, fmt):
+    """Stream the user's order lines (purchases for buyers, sales for vendors) as CSV or NDJSON"""
+    if fmt not in EXPORT_FORMATS:
+        raise Http404('Unknown export format')
+    
+    # Under ASGI only an async iterator is streamed as it is produced
+    stream = astream_export if isinstance(request, ASGIRequest) else stream_export
+    response = StreamingHttpResponse(
+        stream(request.user, fmt, settings.ORDER_EXPORT_CHUNK_SIZE),
+        content_type=EXPORT_FORMATS[fmt],
+    )
+    filename = f"orders-{timezone.localdate():%Y%m%d}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
 @login_required
@@ -532,24 +593,22 @@ def add_review(request, product_id):
     product = get_object_or_404(Product, id=product_id)
     
     # Check if user has purchased (for verified review)
-    has_purchased = OrderItem.objects.filter(
-        order__buyer=request.user,
-        product=product
-    ).exists()
+    purchased = has_purchased(request.user, product.id)
     
     # Check if review already exists
-    review, created = Review.objects.get_or_create(
-        product=product,
-        user=request.user,
-        defaults={'is_verified': has_purchased}
-    )
+    review = Review.objects.filter(product=product, user=request.user).first()
+    previous = (review.rating, review.is_verified) if review else None
     
     if request.method == 'POST':
         form = ReviewForm(request.POST, instance=review)
         if form.is_valid():
             review = form.save(commit=False)
-            review.is_verified = has_purchased
-            review.save()
+            review.product = product
+            review.user = request.user
+            review.is_verified = purchased
+            with transaction.atomic():
+                review.save()
+                apply_review_change(product.id, previous, (review.rating, review.is_verified))
             messages.success(request, 'Review submitted successfully!')
             return redirect('product_detail', product_id=product_id)
     else:
@@ -558,7 +617,7 @@ def add_review(request, product_id):
     return render(request, 'ecommerce/review_form.html', {
         'form': form,
         'product': product,
-        'has_purchased': has_purchased,
+        'has_purchased': purchased,
     })
 
 
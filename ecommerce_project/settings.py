@@ -2,9 +2,12 @@
 Django settings for ecommerce_project project.
 """
 
+from copy import deepcopy
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -34,6 +37,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ecommerce.middleware.QueryProfilingMiddleware',
+    'ecommerce.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -43,6 +48,11 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request query profiling (query count, DB/render time, N+1 detection)
+# reported in X-DB-* response headers and the 'ecommerce.profiling' logger.
+QUERY_PROFILER_ENABLED = os.environ.get('QUERY_PROFILER_ENABLED', '') == '1'
+QUERY_PROFILER_N_PLUS_ONE_THRESHOLD = 5
+
 ROOT_URLCONF = 'ecommerce_project.urls'
 
 TEMPLATES = [
@@ -68,30 +78,134 @@ WSGI_APPLICATION = 'ecommerce_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-# Database configuration
-# For MariaDB/MySQL, uncomment and configure:
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.mysql',
-#         'NAME': 'ecommerce_db',
-#         'USER': 'root',
-#         'PASSWORD': '',
-#         'HOST': 'localhost',
-#         'PORT': '3306',
-#         'OPTIONS': {
-#             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
-#         },
-#     }
-# }
-
-# For SQLite (easier for development/testing):
+# Configured from the environment; with nothing set this is the development
+# SQLite file. DB_ENGINE is 'sqlite', 'mysql' (MariaDB/MySQL) or 'postgresql':
+#   DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT  connection details
+#   DB_CONN_MAX_AGE       seconds to keep a connection open between requests
+#                         (default 60; 0 closes it after every request). Under
+#                         ASGI set 0 and use DB_POOL or a pooling proxy instead,
+#                         since async views run their queries in per-request threads.
+#   DB_CONN_HEALTH_CHECKS check a persistent connection before reusing it (default 1)
+#   DB_POOL               PostgreSQL only: use psycopg's connection pool instead
+#                         of persistent connections (pip install "psycopg[pool]")
+DB_ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'mysql': 'django.db.backends.mysql',
+    'postgresql': 'django.db.backends.postgresql',
+}
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+if DB_ENGINE not in DB_ENGINES:
+    raise ImproperlyConfigured(f"DB_ENGINE must be one of {', '.join(DB_ENGINES)}, not {DB_ENGINE!r}")
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': DB_ENGINES[DB_ENGINE],
+        'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3' if DB_ENGINE == 'sqlite' else 'ecommerce_db'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
+        'OPTIONS': {},
+    }
+}
+if DB_ENGINE != 'sqlite':
+    DATABASES['default'].update(
+        USER=os.environ.get('DB_USER', 'root' if DB_ENGINE == 'mysql' else 'postgres'),
+        PASSWORD=os.environ.get('DB_PASSWORD', ''),
+        HOST=os.environ.get('DB_HOST', 'localhost'),
+        PORT=os.environ.get('DB_PORT', ''),
+    )
+if DB_ENGINE == 'sqlite':
+    # Take the write lock when a transaction starts. With SQLite's default
+    # DEFERRED mode a checkout reads first and fails with "database is locked"
+    # if another writer commits before it upgrades; IMMEDIATE waits on
+    # busy_timeout instead.
+    DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+    # Tests use a file too: the in-memory test database shares one cache
+    # between connections, which reports lock waits as errors immediately
+    # and would hide how concurrent checkouts really behave.
+    DATABASES['default']['TEST'] = {'NAME': BASE_DIR / 'test_db.sqlite3'}
+if DB_ENGINE == 'mysql':
+    DATABASES['default']['OPTIONS']['init_command'] = "SET sql_mode='STRICT_TRANS_TABLES'"
+if DB_ENGINE == 'postgresql' and os.environ.get('DB_POOL', '') == '1':
+    # The pool replaces persistent connections; Django requires CONN_MAX_AGE = 0
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
     }
+
+# Optional read replica, set up like the primary but with DB_REPLICA_NAME (an
+# SQLite file, or the replica's database name) and DB_REPLICA_HOST/PORT. Only
+# views decorated with ecommerce.routers.read_from_replica read from it (see
+# ReplicaRouter); tests mirror it onto the primary.
+if os.environ.get('DB_REPLICA_NAME') or os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = deepcopy(DATABASES['default'])
+    DATABASES['replica'].update(
+        NAME=os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        TEST={'MIRROR': 'default'},
+    )
+    if DB_ENGINE != 'sqlite':
+        DATABASES['replica'].update(
+            HOST=os.environ.get('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+            PORT=os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        )
+DATABASE_REPLICA_ALIAS = 'replica' if 'replica' in DATABASES else None
+DATABASE_ROUTERS = ['ecommerce.routers.ReplicaRouter']
+# After a request writes, the client reads from the primary for this long
+REPLICA_STICKY_SECONDS = 10
+REPLICA_STICKY_COOKIE = 'primary_until'
+
+# Applied to every new SQLite connection (see ecommerce.signals): WAL lets
+# readers run alongside a writer, NORMAL sync is durable under WAL except on
+# power loss, busy_timeout (ms) waits for locks instead of failing, and
+# mmap_size (bytes) serves reads from the page cache without copying.
+SQLITE_PRAGMAS = {
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+# WAL is stored in the database file itself, so it is only switched on for a
+# database chosen with DB_NAME and the committed db.sqlite3 is left as it is.
+# DB_SQLITE_WAL=1 or 0 overrides this.
+if os.environ.get('DB_SQLITE_WAL', '1' if 'DB_NAME' in os.environ else '0') == '1':
+    SQLITE_PRAGMAS = {'journal_mode': 'wal', **SQLITE_PRAGMAS}
+
+
+# Caches
+# 'sessions' fronts the session table (see SESSION_ENGINE below) and
+# 'fragments' holds rendered template fragments (product cards); LocMemCache
+# evicts least-recently-used entries once MAX_ENTRIES is reached. Point them at
+# a shared backend (e.g. Redis or Memcached) when running several processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+        'TIMEOUT': 86400,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'TIMEOUT': 86400,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }
 
+PRODUCT_CARD_CACHE = 'fragments'
+PRODUCT_CARD_CACHE_TIMEOUT = 86400
+
+# Per-buyer lifetime order totals shown on the order history page; dropped
+# at checkout, so the timeout only bounds staleness from admin edits.
+ORDER_SUMMARY_CACHE = 'default'
+ORDER_SUMMARY_CACHE_TIMEOUT = 3600
+
 
 # Custom User Model
 AUTH_USER_MODEL = 'ecommerce.User'
@@ -138,11 +252,35 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are streamed to disk and checked chunk by chunk (see ecommerce.uploads)
+FILE_UPLOAD_HANDLERS = ['ecommerce.uploads.ImageUploadHandler']
+PRODUCT_IMAGE_MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+
+# Product image renditions (generated by `manage.py process_images`)
+PRODUCT_IMAGE_RENDITION_WIDTHS = [200, 400, 800]
+PRODUCT_IMAGE_RENDITION_FORMAT = 'WEBP'  # or 'JPEG'; falls back to JPEG without WebP support
+PRODUCT_IMAGE_RENDITION_QUALITY = 80
+PRODUCT_IMAGE_BATCH_SIZE = 20
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Catalog, review and search page sizes
+CATALOG_PAGE_SIZE = 24
+CATALOG_MAX_PAGE_SIZE = 100
+REVIEWS_PAGE_SIZE = 10
+ORDER_HISTORY_PAGE_SIZE = 20
+ORDER_HISTORY_MAX_PAGE_SIZE = 100
+SEARCH_RESULTS_LIMIT = 50
+
+# Days of sales history charted on the vendor dashboard
+VENDOR_DASHBOARD_DAYS = 30
+
+# Rows fetched per round trip when streaming order exports
+ORDER_EXPORT_CHUNK_SIZE = 2000
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For development
 # For production, use SMTP:
@@ -153,12 +291,23 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For developm
 # EMAIL_HOST_USER = 'your-email@gmail.com'
 # EMAIL_HOST_PASSWORD = 'your-password'
 
+# Invoice email outbox (drained by `manage.py send_outbox`)
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BACKOFF = 30  # seconds, doubled after each failed attempt
+OUTBOX_MAX_BACKOFF = 3600
+OUTBOX_LEASE_SECONDS = 300
+
 # Login URLs
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
 
 # Session Configuration
+# Sessions (and the cart inside them) are read from the 'sessions' cache and
+# only fall back to the database on a miss. They are written only when they
+# change, so read-only page views do not touch the session table.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
 SESSION_COOKIE_AGE = 86400  # 24 hours
-SESSION_SAVE_EVERY_REQUEST = True
 